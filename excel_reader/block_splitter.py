@@ -3,13 +3,97 @@
 """
 import numpy as np
 from collections import deque
-from typing import List, Tuple, Dict, Set
+from typing import List, Tuple, Dict, Set, Optional
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
 from .config import ParserConfig
 from .models import FileFormat
+from .grid_builder import Borders
+
+
+_NEIGHBORS_8 = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def _dilate_down_right(mask: np.ndarray, n_rows: int, n_cols: int) -> np.ndarray:
+    """
+    将每个 True 单元向右下扩张为 n_rows x n_cols 的矩形（单侧膨胀）
+    """
+    dilated = mask.copy()
+    for dr in range(1, n_rows):
+        dilated[dr:, :] |= mask[:-dr, :]
+    expanded = dilated.copy()
+    for dc in range(1, n_cols):
+        expanded[:, dc:] |= dilated[:, :-dc]
+    return expanded
+
+
+def _partition_from_gaps(gaps: np.ndarray, length: int, min_len: int) -> List[Tuple[int, int]]:
+    """
+    按空行/空列位置切分 [0, length)，返回长度不小于 min_len 的 (start, stop) 区间
+    """
+    spans = []
+    start = 0
+    for gap in gaps.tolist():
+        if gap - start >= min_len:
+            spans.append((start, gap))
+        start = gap + 1
+    if length - start >= min_len:
+        spans.append((start, length))
+    return spans
+
+
+def integral_image(O: np.ndarray) -> np.ndarray:
+    """
+    占用矩阵的积分图（首行首列补零），形状 (n_rows + 1, n_cols + 1)
+    累计值不超过单元总数，能用 int32 时不用 int64（积分图是网格上最大的一张矩阵）
+    """
+    n_rows, n_cols = O.shape
+    dtype = np.int32 if n_rows * n_cols <= np.iinfo(np.int32).max else np.int64
+    integral = np.zeros((n_rows + 1, n_cols + 1), dtype=dtype)
+    np.cumsum(O, axis=0, dtype=dtype, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    return integral
+
+
+def rect_sum(integral: np.ndarray, r0: int, r1: int, c0: int, c1: int) -> int:
+    """
+    O[r0:r1, c0:c1] 的元素和，O(1) 查询；越界部分按切片语义截断
+    """
+    r1 = min(r1, integral.shape[0] - 1)
+    c1 = min(c1, integral.shape[1] - 1)
+    if r1 <= r0 or c1 <= c0:
+        return 0
+    return int(integral[r1, c1] - integral[r0, c1] - integral[r1, c0] + integral[r0, c0])
+
+
+def border_completeness(block: "Block", B: Borders) -> float:
+    """
+    边框完整性：块四条外边上的边框数 / (4 * 块内单元数)
+    """
+    r1 = min(block.r1, B.shape[0])
+    c1 = min(block.c1, B.shape[1])
+    if r1 <= block.r0 or c1 <= block.c0:
+        return 0.0
+    
+    # 只读四条边，每条都是单通道的连续行/列；超出 B 范围的下/右边界不计入
+    border_count = np.count_nonzero(B.top[block.r0, block.c0:c1])        # 上边界
+    if block.c1 == c1:
+        border_count += np.count_nonzero(B.right[block.r0:r1, c1 - 1])   # 右边界
+    if block.r1 == r1:
+        border_count += np.count_nonzero(B.bottom[r1 - 1, block.c0:c1])  # 下边界
+    border_count += np.count_nonzero(B.left[block.r0:r1, block.c0])      # 左边界
+    
+    total_count = 4 * (r1 - block.r0) * (c1 - block.c0)
+    return border_count / total_count
 
 
 class Block:
     """表块"""
+    __slots__ = ("r0", "r1", "c0", "c1", "block_id")  # 分割枚举中会创建大量块，不需要实例 __dict__
+    
     def __init__(self, r0: int, r1: int, c0: int, c1: int, block_id: str = ""):
         self.r0 = r0
         self.r1 = r1
@@ -39,32 +123,39 @@ class BlockSplitter:
     def __init__(self, config: ParserConfig, format: FileFormat):
         self.config = config
         self.format = format
+        self.O_integral = None  # split_blocks 时构建，供 Cleaner 复用
     
-    def split_blocks(self, O: np.ndarray, B: np.ndarray = None) -> List[Block]:
+    def split_blocks(self, O: np.ndarray, B: Optional[Borders] = None) -> List[Block]:
         """
         分割表块
         O: 占用矩阵
-        B: 边框矩阵（可选，xlsx 使用）
+        B: 边框图（可选，xlsx 使用）
         """
         if O.size == 0:
             return []
         
+        # 积分图：块内非空计数 O(1)
+        self.O_integral = integral_image(O)
+        
         # 1. 连通域检测
         blocks = self._connected_components(O)
         
-        # 2. 过滤小块
-        blocks = [b for b in blocks if b.height >= self.config.min_block_height 
-                  and b.width >= self.config.min_block_width]
-        
-        # 3. 对于 xlsx，使用边框增强
-        if self.format == FileFormat.xlsx and B is not None:
-            blocks = self._enhance_with_borders(blocks, O, B)
-        
-        # 4. MDL 决策：判断是否需要进一步拆分
+        # 2~4. 单次遍历：过滤小块 → 边框增强（xlsx）→ MDL 拆分决策
+        # 每个块的非空计数只算一次，传给 MDL 复用
+        min_height = self.config.min_block_height
+        min_width = self.config.min_block_width
+        use_borders = self.format == FileFormat.xlsx and B is not None
         final_blocks = []
         for block in blocks:
-            sub_blocks = self._mdl_split_decision(block, O, B)
-            final_blocks.extend(sub_blocks)
+            if block.height < min_height or block.width < min_width:
+                continue
+            
+            occupied = self._occupied_count(block, O)
+            candidates = self._enhance_with_borders(block, O, B) if use_borders else [block]
+            for candidate in candidates:
+                final_blocks.extend(self._mdl_split_decision(
+                    candidate, O, B, occupied if candidate is block else None
+                ))
         
         # 5. 分配 block_id
         for idx, block in enumerate(final_blocks):
@@ -75,26 +166,57 @@ class BlockSplitter:
     def _connected_components(self, O: np.ndarray) -> List[Block]:
         """
         连通域检测，容忍空洞
+        两个非空单元行距 <= hole_tolerance_rows+1 且列距 <= hole_tolerance_cols+1 即视为相连
         """
+        hole_r = self.config.hole_tolerance_rows
+        hole_c = self.config.hole_tolerance_cols
+        occupied = O.astype(bool)
+        
+        # 单侧膨胀 (hole_r+1)x(hole_c+1) 后按 8 连通求连通域，与上述邻域判定等价
+        dilated = _dilate_down_right(occupied, hole_r + 1, hole_c + 1)
+        
+        if ndimage is None:
+            return self._connected_components_bfs(occupied, dilated)
+        
         n_rows, n_cols = O.shape
-        visited = np.zeros_like(O, dtype=bool)
+        # 标记按光栅顺序分配，块顺序与逐行扫描的发现顺序一致
+        labels, _ = ndimage.label(dilated, structure=np.ones((3, 3), dtype=bool))
+        
+        # 外接框只取原始非空单元，再按空洞容忍度扩展
+        slices = ndimage.find_objects(np.where(occupied, labels, 0))
         blocks = []
+        for row_slice, col_slice in filter(None, slices):
+            blocks.append(Block(
+                max(0, row_slice.start - hole_r),
+                min(n_rows, row_slice.stop + hole_r),
+                max(0, col_slice.start - hole_c),
+                min(n_cols, col_slice.stop + hole_c)
+            ))
         
-        for r in range(n_rows):
-            for c in range(n_cols):
-                if O[r, c] == 1 and not visited[r, c]:
-                    # 从 (r, c) 开始 BFS
-                    block = self._bfs_connected(O, visited, r, c)
-                    if block:
-                        blocks.append(block)
+        return blocks
+    
+    def _connected_components_bfs(self, occupied: np.ndarray, dilated: np.ndarray) -> List[Block]:
+        """
+        连通域检测（纯 Python BFS，scipy 不可用时使用）
+        在膨胀后的掩码上做 8 邻域 BFS
+        """
+        n_rows, n_cols = occupied.shape
+        visited = np.zeros_like(dilated, dtype=bool)
+        blocks = []
+        
+        for r, c in np.argwhere(occupied).tolist():
+            if not visited[r, c]:
+                # 从 (r, c) 开始 BFS
+                blocks.append(self._bfs_connected(occupied, dilated, visited, r, c))
         
         return blocks
     
-    def _bfs_connected(self, O: np.ndarray, visited: np.ndarray, start_r: int, start_c: int) -> Block:
+    def _bfs_connected(self, occupied: np.ndarray, dilated: np.ndarray, visited: np.ndarray,
+                       start_r: int, start_c: int) -> Block:
         """
         BFS 连通域，容忍空洞
         """
-        n_rows, n_cols = O.shape
+        n_rows, n_cols = dilated.shape
         queue = deque([(start_r, start_c)])
         visited[start_r, start_c] = True
         
@@ -103,94 +225,74 @@ class BlockSplitter:
         
         while queue:
             r, c = queue.popleft()
-            min_r = min(min_r, r)
-            max_r = max(max_r, r)
-            min_c = min(min_c, c)
-            max_c = max(max_c, c)
+            # 外接框只统计原始非空单元
+            if occupied[r, c]:
+                min_r = min(min_r, r)
+                max_r = max(max_r, r)
+                min_c = min(min_c, c)
+                max_c = max(max_c, c)
             
-            # 检查邻接（上下左右 + 容忍空洞）
-            for dr in range(-self.config.hole_tolerance_rows - 1, self.config.hole_tolerance_rows + 2):
-                for dc in range(-self.config.hole_tolerance_cols - 1, self.config.hole_tolerance_cols + 2):
-                    if dr == 0 and dc == 0:
-                        continue
-                    nr, nc = r + dr, c + dc
-                    if 0 <= nr < n_rows and 0 <= nc < n_cols:
-                        if not visited[nr, nc] and O[nr, nc] == 1:
-                            visited[nr, nc] = True
-                            queue.append((nr, nc))
+            # 8 邻域（空洞容忍已由膨胀处理）
+            for dr, dc in _NEIGHBORS_8:
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < n_rows and 0 <= nc < n_cols:
+                    if not visited[nr, nc] and dilated[nr, nc]:
+                        visited[nr, nc] = True
+                        queue.append((nr, nc))
         
         # 扩展边界以包含空洞
-        r0 = max(0, min_r - self.config.hole_tolerance_rows)
-        r1 = min(n_rows, max_r + self.config.hole_tolerance_rows + 1)
-        c0 = max(0, min_c - self.config.hole_tolerance_cols)
-        c1 = min(n_cols, max_c + self.config.hole_tolerance_cols + 1)
+        hole_r = self.config.hole_tolerance_rows
+        hole_c = self.config.hole_tolerance_cols
+        r0 = max(0, min_r - hole_r)
+        r1 = min(n_rows, max_r + hole_r + 1)
+        c0 = max(0, min_c - hole_c)
+        c1 = min(n_cols, max_c + hole_c + 1)
         
         return Block(r0, r1, c0, c1)
     
-    def _enhance_with_borders(self, blocks: List[Block], O: np.ndarray, B: np.ndarray) -> List[Block]:
+    def _enhance_with_borders(self, block: Block, O: np.ndarray, B: Borders) -> List[Block]:
         """
         使用边框信息增强块分割（xlsx）
         基于边框闭合检测轮廓
         """
-        # 简化实现：检查边框完整性
-        enhanced = []
-        for block in blocks:
-            # 检查块边界是否有完整边框
-            border_score = self._calculate_border_completeness(block, B)
-            if border_score > 0.3:  # 有边框则保留
-                enhanced.append(block)
-            else:
-                # 尝试基于边框重新分割
-                sub_blocks = self._split_by_border_contours(block, O, B)
-                enhanced.extend(sub_blocks)
-        
-        return enhanced if enhanced else blocks
+        # 简化实现：检查块边界是否有完整边框
+        border_score = self._calculate_border_completeness(block, B)
+        if border_score > 0.3:  # 有边框则保留
+            return [block]
+        # 尝试基于边框重新分割
+        return self._split_by_border_contours(block, O, B)
     
-    def _calculate_border_completeness(self, block: Block, B: np.ndarray) -> float:
+    def _calculate_border_completeness(self, block: Block, B: Optional[Borders]) -> float:
         """计算边框完整性"""
         if B is None or B.size == 0:
             return 0.0
-        
-        border_count = 0
-        total_count = 0
-        
-        # 检查边界
-        for r in range(block.r0, block.r1):
-            for c in range(block.c0, block.c1):
-                if r < B.shape[0] and c < B.shape[1]:
-                    borders = B[r, c]
-                    if r == block.r0:  # 上边界
-                        border_count += borders[0]  # top
-                    if r == block.r1 - 1:  # 下边界
-                        border_count += borders[2]  # bottom
-                    if c == block.c0:  # 左边界
-                        border_count += borders[3]  # left
-                    if c == block.c1 - 1:  # 右边界
-                        border_count += borders[1]  # right
-                    total_count += 4
-        
-        return border_count / max(total_count, 1)
+        return border_completeness(block, B)
     
-    def _split_by_border_contours(self, block: Block, O: np.ndarray, B: np.ndarray) -> List[Block]:
+    def _split_by_border_contours(self, block: Block, O: np.ndarray, B: Borders) -> List[Block]:
         """基于边框轮廓分割（简化实现）"""
         # 简化：如果边框不完整，尝试按空行/空列分割
         return [block]  # 暂时不实现复杂轮廓检测
     
-    def _mdl_split_decision(self, block: Block, O: np.ndarray, B: np.ndarray = None) -> List[Block]:
+    def _mdl_split_decision(self, block: Block, O: np.ndarray, B: Optional[Borders] = None,
+                            occupied: Optional[int] = None) -> List[Block]:
         """
         MDL 代价函数决策：是否拆分
         Cost = α*(1-密度) + β*(1-矩形度) + γ*(块数量)
+        occupied: 已算好的块内非空数（可选）
         """
-        # 计算当前块的密度和矩形度
-        block_region = O[block.r0:block.r1, block.c0:block.c1]
-        density = float(np.sum(block_region)) / max(block.area, 1)
-        rectangularity = self._calculate_rectangularity(block, O)
+        w_density, w_rect, w_count = self.config.mdl_weights
+        
+        # 计算当前块的密度和矩形度（共用同一次非空计数）
+        if occupied is None:
+            occupied = self._occupied_count(block, O)
+        density = float(occupied) / max(block.area, 1)
+        rectangularity = self._calculate_rectangularity(block, O, occupied)
         
         # 不拆分的代价
         cost_no_split = (
-            self.config.mdl_weights[0] * (1 - density) +
-            self.config.mdl_weights[1] * (1 - rectangularity) +
-            self.config.mdl_weights[2] * 1  # 1个块
+            w_density * (1 - density) +
+            w_rect * (1 - rectangularity) +
+            w_count * 1  # 1个块
         )
         
         # 尝试拆分的代价（简化：按空行/空列拆分）
@@ -204,14 +306,14 @@ class BlockSplitter:
                 # 计算拆分后的总代价
                 total_cost = 0.0
                 for sub_block in split_blocks:
-                    sub_region = O[sub_block.r0:sub_block.r1, sub_block.c0:sub_block.c1]
-                    sub_density = float(np.sum(sub_region)) / max(sub_block.area, 1)
-                    sub_rect = self._calculate_rectangularity(sub_block, O)
+                    sub_occupied = self._occupied_count(sub_block, O)
+                    sub_density = float(sub_occupied) / max(sub_block.area, 1)
+                    sub_rect = self._calculate_rectangularity(sub_block, O, sub_occupied)
                     total_cost += (
-                        self.config.mdl_weights[0] * (1 - sub_density) +
-                        self.config.mdl_weights[1] * (1 - sub_rect)
+                        w_density * (1 - sub_density) +
+                        w_rect * (1 - sub_rect)
                     )
-                total_cost += self.config.mdl_weights[2] * len(split_blocks)
+                total_cost += w_count * len(split_blocks)
                 cost_split = total_cost
         
         # 选择代价更小的方案
@@ -220,76 +322,61 @@ class BlockSplitter:
         else:
             return [block]
     
-    def _calculate_rectangularity(self, block: Block, O: np.ndarray) -> float:
-        """计算矩形度：实际占用区域与矩形框的比例"""
-        block_region = O[block.r0:block.r1, block.c0:block.c1]
-        occupied = np.sum(block_region)
+    def _calculate_rectangularity(self, block: Block, O: np.ndarray, occupied: int = None) -> float:
+        """
+        计算矩形度：实际占用区域与矩形框的比例
+        occupied: 已算好的块内非空数（可选，避免重复计数）
+        注意：按当前定义矩形度与密度数值相同，MDL 代价中二者实际是同一项
+        """
+        if occupied is None:
+            occupied = self._occupied_count(block, O)
         total = block.area
         return float(occupied) / max(total, 1)
     
+    def _occupied_count(self, block: Block, O: np.ndarray) -> int:
+        """块内非空单元数"""
+        if self.O_integral is not None:
+            return rect_sum(self.O_integral, block.r0, block.r1, block.c0, block.c1)
+        return int(np.count_nonzero(O[block.r0:block.r1, block.c0:block.c1]))
+    
+    def _line_counts(self, block: Block, O: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        块内逐行、逐列的非空计数
+        有积分图时只读块的四条边线（O(h+w)），不再扫描整块
+        """
+        if self.O_integral is None:
+            block_region = O[block.r0:block.r1, block.c0:block.c1]
+            return np.count_nonzero(block_region, axis=1), np.count_nonzero(block_region, axis=0)
+        
+        integral = self.O_integral
+        r1 = min(block.r1, integral.shape[0] - 1)
+        c1 = min(block.c1, integral.shape[1] - 1)
+        row_counts = np.diff(integral[block.r0:r1 + 1, c1] - integral[block.r0:r1 + 1, block.c0])
+        col_counts = np.diff(integral[r1, block.c0:c1 + 1] - integral[block.r0, block.c0:c1 + 1])
+        return row_counts, col_counts
+    
     def _try_split_by_gaps(self, block: Block, O: np.ndarray) -> List[Block]:
         """尝试按空行/空列拆分"""
-        block_region = O[block.r0:block.r1, block.c0:block.c1]
-        n_rows, n_cols = block_region.shape
-        
-        # 查找空行
-        empty_rows = []
-        for r in range(n_rows):
-            if np.sum(block_region[r, :]) == 0:
-                empty_rows.append(r)
+        row_counts, col_counts = self._line_counts(block, O)
+        n_rows, n_cols = len(row_counts), len(col_counts)
         
-        # 查找空列
-        empty_cols = []
-        for c in range(n_cols):
-            if np.sum(block_region[:, c]) == 0:
-                empty_cols.append(c)
+        # 查找空行/空列
+        empty_rows = np.flatnonzero(row_counts == 0)
+        empty_cols = np.flatnonzero(col_counts == 0)
         
         # 如果空行/空列足够大，则拆分
         if len(empty_rows) >= 2:
             # 按空行拆分
-            splits = []
-            start = 0
-            for empty_r in empty_rows:
-                if empty_r - start >= self.config.min_block_height:
-                    splits.append(Block(
-                        block.r0 + start,
-                        block.r0 + empty_r,
-                        block.c0,
-                        block.c1
-                    ))
-                start = empty_r + 1
-            if block.r1 - (block.r0 + start) >= self.config.min_block_height:
-                splits.append(Block(
-                    block.r0 + start,
-                    block.r1,
-                    block.c0,
-                    block.c1
-                ))
-            if len(splits) > 1:
-                return splits
+            spans = _partition_from_gaps(empty_rows, n_rows, self.config.min_block_height)
+            if len(spans) > 1:
+                return [Block(block.r0 + start, block.r0 + stop, block.c0, block.c1)
+                        for start, stop in spans]
         
         if len(empty_cols) >= 2:
             # 按空列拆分
-            splits = []
-            start = 0
-            for empty_c in empty_cols:
-                if empty_c - start >= self.config.min_block_width:
-                    splits.append(Block(
-                        block.r0,
-                        block.r1,
-                        block.c0 + start,
-                        block.c0 + empty_c
-                    ))
-                start = empty_c + 1
-            if block.c1 - (block.c0 + start) >= self.config.min_block_width:
-                splits.append(Block(
-                    block.r0,
-                    block.r1,
-                    block.c0 + start,
-                    block.c1
-                ))
-            if len(splits) > 1:
-                return splits
+            spans = _partition_from_gaps(empty_cols, n_cols, self.config.min_block_width)
+            if len(spans) > 1:
+                return [Block(block.r0, block.r1, block.c0 + start, block.c0 + stop)
+                        for start, stop in spans]
         
         return [block]
-
@@ -4,21 +4,57 @@
 import pandas as pd
 import numpy as np
 import re
-from collections import Counter
-from typing import List, Dict, Tuple, Optional
+from typing import List, Tuple, Optional, Pattern, Union
 from .models import TableScore, WarningCode
-from .block_splitter import Block
-from .config import ParserConfig
+from .block_splitter import Block, border_completeness, rect_sum
+from .config import ParserConfig, UNIT_GROUP_PREFIX
+from .grid_builder import Borders
+
+
+def _column_modes(T_block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按列求类型众数，返回 (众数, 出现次数)
+    并列时取在列中最先出现的类型，与 Counter.most_common 一致
+    """
+    n_rows = T_block.shape[0]
+    types = np.unique(T_block)
+    counts = np.empty((len(types), T_block.shape[1]), dtype=np.int64)
+    first_rows = np.empty_like(counts)
+    for i, t in enumerate(types):
+        is_t = T_block == t
+        counts[i] = np.count_nonzero(is_t, axis=0)
+        first_rows[i] = np.where(counts[i] > 0, is_t.argmax(axis=0), n_rows)
+    
+    mode_counts = counts.max(axis=0)
+    first_rows[counts < mode_counts] = n_rows
+    modes = types[first_rows.argmin(axis=0)]
+    return modes, mode_counts
+
+
+def _unit_line_window(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """单位行检查窗口（前10行、前5列），按行优先展平为 (str(val) 数组, 非空掩码)"""
+    window = df.iloc[:10, :5].to_numpy(dtype=object)
+    return window.astype(str).ravel(), pd.notna(window).ravel()
+
+
+def _stripped_str_array(df: pd.DataFrame) -> np.ndarray:
+    """逐单元 str(val).strip() 的向量化版本"""
+    return np.char.strip(df.to_numpy(dtype=object).astype(str))
 
 
 class Cleaner:
     """数据清洗器"""
     
-    def __init__(self, config: ParserConfig):
+    def __init__(self, config: ParserConfig, O_integral: Optional[np.ndarray] = None):
+        """
+        O_integral: 占用矩阵的积分图（可选，见 block_splitter.integral_image），
+                    提供时块内非空计数为 O(1) 查询
+        """
         self.config = config
+        self.O_integral = O_integral
     
     def calculate_table_score(self, block: Block, O: np.ndarray, T: np.ndarray, 
-                             B: np.ndarray = None, header_rows: List[int] = None) -> TableScore:
+                             B: Optional[Borders] = None, header_rows: List[int] = None) -> TableScore:
         """
         计算表块评分
         """
@@ -28,41 +64,19 @@ class Cleaner:
         score.area = block.area
         
         # 密度
-        block_region = O[block.r0:block.r1, block.c0:block.c1]
-        score.density = float(np.sum(block_region)) / max(block.area, 1)
+        score.density = float(self._occupied_count(block, O)) / max(block.area, 1)
         
-        # 类型一致性（同一列类型应该一致）
-        type_consistency = 0.0
-        for c in range(block.c0, block.c1):
-            col_types = []
-            for r in range(block.r0, block.r1):
-                if r < T.shape[0] and c < T.shape[1]:
-                    col_types.append(T[r, c])
-            if col_types:
-                # 计算最常见的类型占比
-                most_common_count = Counter(col_types).most_common(1)[0][1]
-                type_consistency += most_common_count / len(col_types)
-        type_consistency /= max(block.width, 1)
-        score.type_consistency = type_consistency
+        # 类型一致性（同一列类型应该一致）：各列众数占比的均值
+        T_block = T[block.r0:block.r1, block.c0:block.c1]
+        if T_block.size:
+            _, mode_counts = _column_modes(T_block)
+            score.type_consistency = float(mode_counts.sum()) / T_block.shape[0] / max(block.width, 1)
+        else:
+            score.type_consistency = 0.0
         
         # 边框完整性
         if B is not None:
-            border_count = 0
-            total_edges = 0
-            for r in range(block.r0, block.r1):
-                for c in range(block.c0, block.c1):
-                    if r < B.shape[0] and c < B.shape[1]:
-                        borders = B[r, c]
-                        if r == block.r0:
-                            border_count += borders[0]  # top
-                        if r == block.r1 - 1:
-                            border_count += borders[2]  # bottom
-                        if c == block.c0:
-                            border_count += borders[3]  # left
-                        if c == block.c1 - 1:
-                            border_count += borders[1]  # right
-                        total_edges += 4
-            score.border_completeness = border_count / max(total_edges, 1)
+            score.border_completeness = border_completeness(block, B)
         else:
             score.border_completeness = 0.5  # 默认值
         
@@ -74,33 +88,16 @@ class Cleaner:
             score.header_completeness = 0.0
         
         # 综合评分
+        w_density, w_type, w_border, w_header = self.config.score_weights
         score.total = (
-            score.density * 0.3 +
-            score.type_consistency * 0.25 +
-            score.border_completeness * 0.2 +
-            score.header_completeness * 0.25
+            score.density * w_density +
+            score.type_consistency * w_type +
+            score.border_completeness * w_border +
+            score.header_completeness * w_header
         )
         
         return score
     
-    def identify_main_table(self, blocks: List[Block], scores: Dict[str, TableScore]) -> str:
-        """
-        识别主表（评分最高）
-        """
-        if not blocks:
-            return ""
-        
-        best_block_id = blocks[0].block_id
-        best_score = scores.get(best_block_id, TableScore()).total
-        
-        for block in blocks[1:]:
-            score = scores.get(block.block_id, TableScore()).total
-            if score > best_score:
-                best_score = score
-                best_block_id = block.block_id
-        
-        return best_block_id
-    
     def try_merge_blocks(self, block1: Block, block2: Block, O: np.ndarray, 
                          T: np.ndarray, header_rows: List[int] = None) -> Tuple[bool, float]:
         """
@@ -115,11 +112,10 @@ class Cleaner:
         
         # 计算密度变化
         merged_block = self._merge_bbox(block1, block2)
-        merged_region = O[merged_block.r0:merged_block.r1, merged_block.c0:merged_block.c1]
-        merged_density = float(np.sum(merged_region)) / max(merged_block.area, 1)
+        merged_density = float(self._occupied_count(merged_block, O)) / max(merged_block.area, 1)
         density_change = merged_density - min(
-            float(np.sum(O[block1.r0:block1.r1, block1.c0:block1.c1])) / max(block1.area, 1),
-            float(np.sum(O[block2.r0:block2.r1, block2.c0:block2.c1])) / max(block2.area, 1)
+            float(self._occupied_count(block1, O)) / max(block1.area, 1),
+            float(self._occupied_count(block2, O)) / max(block2.area, 1)
         )
         
         # 惩罚（如果块之间距离太远）
@@ -137,6 +133,12 @@ class Cleaner:
         
         return should_merge, gain
     
+    def _occupied_count(self, block: Block, O: np.ndarray) -> int:
+        """块内非空单元数"""
+        if self.O_integral is not None:
+            return rect_sum(self.O_integral, block.r0, block.r1, block.c0, block.c1)
+        return int(np.count_nonzero(O[block.r0:block.r1, block.c0:block.c1]))
+    
     def _calculate_alignment(self, block1: Block, block2: Block) -> float:
         """计算列对齐度"""
         # 如果水平相邻
@@ -161,22 +163,14 @@ class Cleaner:
         if overlap_c1 <= overlap_c0:
             return 0.0
         
-        consistency = 0.0
-        for c in range(overlap_c0, overlap_c1):
-            types1 = []
-            types2 = []
-            for r in range(block1.r0, block1.r1):
-                if r < T.shape[0] and c < T.shape[1]:
-                    types1.append(T[r, c])
-            for r in range(block2.r0, block2.r1):
-                if r < T.shape[0] and c < T.shape[1]:
-                    types2.append(T[r, c])
-            
-            if types1 and types2:
-                common1 = Counter(types1).most_common(1)[0][0]
-                common2 = Counter(types2).most_common(1)[0][0]
-                if common1 == common2:
-                    consistency += 1.0
+        T_block1 = T[block1.r0:block1.r1, overlap_c0:overlap_c1]
+        T_block2 = T[block2.r0:block2.r1, overlap_c0:overlap_c1]
+        if T_block1.size == 0 or T_block2.size == 0:
+            return 0.0
+        
+        modes1, _ = _column_modes(T_block1)
+        modes2, _ = _column_modes(T_block2)
+        consistency = float(np.count_nonzero(modes1 == modes2))
         
         return consistency / max(overlap_c1 - overlap_c0, 1)
     
@@ -200,76 +194,107 @@ class Cleaner:
         return min(1.0, gap / 10.0)
     
     def clean_dataframe(self, df: pd.DataFrame, header_rows: List[int], 
-                       unit_patterns: List[str]) -> Tuple[pd.DataFrame, Optional[str], List[int]]:
+                       unit_patterns: Optional[List[Union[str, Pattern]]] = None,
+                       copy: bool = False) -> Tuple[pd.DataFrame, Optional[str], List[int]]:
         """
-        清洗 DataFrame
+        清洗 DataFrame（不修改传入的 df；需要移除行时返回新对象，否则返回原对象）
+        unit_patterns: 单位行正则，可传入预编译的 Pattern；省略时使用 config 中预编译的单位行正则
+                       （能合并时只用合并后的单个正则扫描一遍窗口）
+        copy: 为 True 时无论是否有修改都返回副本
         返回: (清洗后的df, 单位字符串, 移除的行索引列表)
         """
-        df_cleaned = df.copy()
+        df_cleaned = df.copy() if copy else df
         removed_rows = []
         unit_str = None
         
         # 1. 移除中段重复表头
         if self.config.allow_mid_headers:
-            removed_rows = self._remove_mid_headers(df_cleaned, header_rows)
+            df_cleaned, removed_rows = self._remove_mid_headers(df_cleaned, header_rows)
         
         # 2. 抽取单位行
-        for pattern in unit_patterns:
-            unit_str = self._extract_unit_line(df_cleaned, pattern)
-            if unit_str:
-                break
+        if unit_patterns is None:
+            unit_str = self._extract_unit_line_combined(df_cleaned)
+        else:
+            unit_str = self._extract_unit_line_each(df_cleaned, unit_patterns)
         
         # 3. 解析日期、金额等（简化实现）
         # 这里可以添加更复杂的解析逻辑
         
         return df_cleaned, unit_str, removed_rows
     
-    def _remove_mid_headers(self, df: pd.DataFrame, header_rows: List[int]) -> List[int]:
-        """移除中段重复表头"""
+    def _remove_mid_headers(self, df: pd.DataFrame, header_rows: List[int]) -> Tuple[pd.DataFrame, List[int]]:
+        """移除中段重复表头，返回 (df, 移除的行)；有行被移除时 df 为新对象"""
         if not header_rows:
-            return []
-        
-        removed = []
-        header_pattern = None
+            return df, []
         
         # 构建表头模式（简化：检查前几列是否与表头行相似）
-        if header_rows:
-            first_header_row = header_rows[0]
-            if first_header_row < df.shape[0]:
-                header_pattern = [str(df.iloc[first_header_row, c]).strip() 
-                                 for c in range(min(5, df.shape[1]))]
-        
-        if not header_pattern:
-            return []
-        
-        # 扫描数据行，查找相似表头
-        for r in range(max(header_rows) + 1, df.shape[0]):
-            row_pattern = [str(df.iloc[r, c]).strip() 
-                          for c in range(min(5, df.shape[1]))]
-            
-            # 检查相似度
-            similarity = sum(1 for h, r in zip(header_pattern, row_pattern) if h == r and h != "")
-            if similarity >= len(header_pattern) * 0.7:  # 70% 相似
-                removed.append(r)
+        first_header_row = header_rows[0]
+        n_check_cols = min(5, df.shape[1])
+        if first_header_row >= df.shape[0] or n_check_cols == 0:
+            return df, []
+        header_pattern = _stripped_str_array(df.iloc[first_header_row:first_header_row + 1, :n_check_cols])[0]
+        
+        # 扫描数据行，查找相似表头（整块比较）
+        start_row = max(header_rows) + 1
+        rows = _stripped_str_array(df.iloc[start_row:, :n_check_cols])
+        similarity = np.count_nonzero((rows == header_pattern) & (header_pattern != ""), axis=1)
+        removed = (np.flatnonzero(similarity >= n_check_cols * 0.7) + start_row).tolist()  # 70% 相似
         
         # 移除这些行
         if removed:
-            df.drop(index=df.index[removed], inplace=True)
-            df.reset_index(drop=True, inplace=True)
+            keep = np.ones(len(df), dtype=bool)
+            keep[removed] = False
+            df = df.iloc[keep].reset_index(drop=True)
         
-        return removed
+        return df, removed
     
-    def _extract_unit_line(self, df: pd.DataFrame, pattern: str) -> Optional[str]:
+    def _extract_unit_line_each(self, df: pd.DataFrame,
+                                unit_patterns: List[Union[str, Pattern]]) -> Optional[str]:
+        """按正则顺序逐个抽取单位行，取第一个有结果的正则"""
+        for pattern in unit_patterns:
+            unit_str = self._extract_unit_line(df, re.compile(pattern))
+            if unit_str:
+                return unit_str
+        return None
+    
+    def _extract_unit_line_combined(self, df: pd.DataFrame) -> Optional[str]:
+        """
+        用合并后的单位行正则扫描一遍窗口，与 _extract_unit_line_each(df, config.unit_line_regexes) 结果一致：
+        命中的最小正则序号即逐个尝试时首个有命中的正则，取该序号的第一个命中单元
+        """
+        combined = self.config.unit_line_regex
+        if combined is None:
+            return self._extract_unit_line_each(df, self.config.unit_line_regexes)
+        
+        strs, notna = _unit_line_window(df)
+        if strs.size == 0:
+            return None
+        prefix_len = len(UNIT_GROUP_PREFIX)
+        pattern_idx = np.frompyfunc(
+            lambda v: int(m.lastgroup[prefix_len:]) if (m := combined.match(v)) else -1, 1, 1
+        )(strs).astype(np.int64)
+        pattern_idx[~notna] = -1
+        hits = np.flatnonzero(pattern_idx >= 0)
+        if not hits.size:
+            return None
+        first = hits[np.argmin(pattern_idx[hits])]  # argmin 取最先出现的最小值
+        unit_str = strs[first].strip()
+        if unit_str:
+            return unit_str
+        # 命中单元全是空白（strip 后为空）：逐个尝试时会继续用后面的正则，退回逐个匹配
+        return self._extract_unit_line_each(df, self.config.unit_line_regexes)
+    
+    def _extract_unit_line(self, df: pd.DataFrame, regex: Pattern) -> Optional[str]:
         """抽取单位行"""
-        import re
-        regex = re.compile(pattern)
-        
-        for r in range(min(10, df.shape[0])):  # 只检查前10行
-            for c in range(min(5, df.shape[1])):
-                val = df.iloc[r, c]
-                if pd.notna(val):
-                    if regex.match(str(val)):
-                        return str(val).strip()
+        strs, notna = _unit_line_window(df)  # 只检查前10行、前5列
+        if strs.size == 0:
+            return None
+        
+        # 按行优先顺序整窗匹配，取第一个命中的非空单元
+        matched = np.frompyfunc(lambda v: regex.match(v) is not None, 1, 1)(strs).astype(bool)
+        hits = np.flatnonzero(matched & notna)
+        if hits.size:
+            return strs[hits[0]].strip()
         
         return None
 
@@ -1,8 +1,9 @@
 """
 配置类定义
 """
+import re
 from dataclasses import dataclass, field
-from typing import List, Tuple, Literal
+from typing import List, Tuple, Literal, Optional, Pattern
 from .models import LogLevel
 from .constants import (
     CSV_ENCODING,
@@ -14,12 +15,36 @@ from .constants import (
     DEFAULT_RECTANGULARITY_THRESHOLD,
     DEFAULT_MDL_WEIGHTS,
     DEFAULT_MERGE_GAIN_THRESHOLD,
+    DEFAULT_SCORE_WEIGHTS,
     DEFAULT_MAX_HEADER_ROWS,
     DEFAULT_HEADER_STYLE_WEIGHT,
     DEFAULT_DUPLICATE_COL_SUFFIX,
 )
 
 
+# 合并正则中第 i 个单位行正则所在的命名分组
+UNIT_GROUP_PREFIX = "_unit"
+
+
+def combine_unit_regexes(regexes: List[Pattern]) -> Optional[Pattern]:
+    """
+    把多个单位行正则合并为一个 (?P<_unit0>p0)|(?P<_unit1>p1)|... 的交替正则，一次 match 即可判断任一命中；
+    match.lastgroup 给出命中的最小序号（交替按顺序尝试）
+    含捕获分组（可能有按序号的反向引用）、flags 不一致或无法合并（如中段的全局内联 flag）时返回 None
+    """
+    if not regexes or any(r.groups for r in regexes) or len({r.flags for r in regexes}) > 1:
+        return None
+    if not all(isinstance(r.pattern, str) for r in regexes):
+        return None
+    try:
+        return re.compile(
+            "|".join(f"(?P<{UNIT_GROUP_PREFIX}{i}>{r.pattern})" for i, r in enumerate(regexes)),
+            regexes[0].flags
+        )
+    except re.error:
+        return None
+
+
 @dataclass
 class ParserConfig:
     # 分割参数
@@ -31,6 +56,7 @@ class ParserConfig:
     rectangularity_threshold: float = DEFAULT_RECTANGULARITY_THRESHOLD
     mdl_weights: Tuple[float, float, float] = DEFAULT_MDL_WEIGHTS  # α, β, γ
     merge_gain_threshold: float = DEFAULT_MERGE_GAIN_THRESHOLD
+    score_weights: Tuple[float, float, float, float] = DEFAULT_SCORE_WEIGHTS  # 表块评分：密度、类型一致性、边框、表头
 
     # 表头解析
     max_header_rows: int = DEFAULT_MAX_HEADER_ROWS
@@ -44,6 +70,7 @@ class ParserConfig:
     csv_na_rep: str = ""
     sanitize_file_name: bool = True
     long_path_support: bool = True
+    fast_export: bool = True  # 安装 pyarrow 时，输出可逐字节对齐 to_csv 的表改用 pyarrow 写出
 
     # 行为
     include_hidden: bool = False
@@ -52,6 +79,8 @@ class ParserConfig:
         r'^\s*单位[:：]\s*.*$', r'^\s*\(单位.*\)\s*$'
     ])
     csv_injection_protection: bool = False  # 默认关闭
+    unit_line_regexes: List[Pattern] = field(init=False, repr=False, compare=False)  # 由 unit_line_patterns 预编译
+    unit_line_regex: Optional[Pattern] = field(init=False, repr=False, compare=False)  # 上者合并成的单个正则（见 combine_unit_regexes）
 
     # 日志
     log_level: LogLevel = LogLevel.INFO
@@ -66,4 +95,12 @@ class ParserConfig:
     style_scan_limit_rows: int = 10000  # 样式扫描的行数限制（只扫描前N行）
     border_scan_limit_rows: int = 10000  # 边框扫描的行数限制（只扫描前N行）
     process_sheets_sequentially: bool = True  # 是否逐个处理 sheet（减少内存占用）
+    workers: int = 0  # 多 sheet 并行解析的进程数（<=1 时串行）
+    block_workers: int = 0  # 单个 sheet 内逐块处理（表头/评分/清洗）的线程数（<=1 或块数少于 4 时串行）
+    engine: Literal["openpyxl", "calamine"] = "openpyxl"  # 读值引擎；"calamine" 需显式开启（xlsx 仅在样式/边框扫描均关闭时生效），未安装时回退 openpyxl/pyxlsb
+    trim_empty: bool = False  # 读取后裁掉末尾全空的行列（陈旧格式会使 sheet 尺寸远大于数据区；会改变贴边表块的 bbox）
+    fast_csv_path: bool = False  # CSV 按单张平表处理：首行即列名，跳过网格构建、分块与表头检测
 
+    def __post_init__(self):
+        self.unit_line_regexes = [re.compile(p) for p in self.unit_line_patterns]
+        self.unit_line_regex = combine_unit_regexes(self.unit_line_regexes)
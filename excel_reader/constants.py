@@ -29,6 +29,7 @@ DEFAULT_DENSITY_THRESHOLD = 0.35
 DEFAULT_RECTANGULARITY_THRESHOLD = 0.8
 DEFAULT_MDL_WEIGHTS = (0.6, 0.3, 0.1)  # α, β, γ
 DEFAULT_MERGE_GAIN_THRESHOLD = 0.5
+DEFAULT_SCORE_WEIGHTS = (0.3, 0.25, 0.2, 0.25)  # 密度、类型一致性、边框完整性、表头完备性
 DEFAULT_MAX_HEADER_ROWS = 6
 DEFAULT_HEADER_STYLE_WEIGHT = 0.6
 DEFAULT_DUPLICATE_COL_SUFFIX = "_dup{n}"
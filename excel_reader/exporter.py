@@ -1,30 +1,93 @@
 """
 导出系统 - CSV导出和Manifest生成
 """
+import os
+import math
+import numpy as np
 import pandas as pd
 import json
 import yaml
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from .models import TableMeta, Manifest, OutputItem, FileFormat
 from .constants import (
     CSV_ENCODING, CSV_DELIMITER, CSV_LINE_TERMINATOR,
     INVALID_FILENAME_CHARS, RUN_TS_FORMAT, DIR_CSV, DIR_ARTIFACTS
 )
 from .exceptions import OutputWriteError
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 有 libyaml 时使用 C 实现的 SafeDumper（输出与纯 Python 版一致）
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# CSV 写出的文件缓冲区大小与 pyarrow 每批格式化的行数
+_WRITE_BUFFER_SIZE = 1 << 22
+_ARROW_CSV_BATCH_ROWS = 65536
+
+# 文件名非法字符 → "_"
+_INVALID_CHARS_TABLE = str.maketrans(dict.fromkeys(INVALID_FILENAME_CHARS, "_"))
+
+# 元数据中浮点数保留的小数位：评分在 [0, 1]，4 位小数时 orjson 与 json 的输出文本一致（均不用指数形式）
+_META_FLOAT_DIGITS = 4
+
+
+def _json_safe(value):
+    """
+    把元数据规整为 orjson 与 json 写出内容一致的形式：
+    numpy 标量转 Python 类型，NaN/inf 转 None，浮点数按 _META_FLOAT_DIGITS 舍入
+    """
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, _META_FLOAT_DIGITS) if math.isfinite(value) else None
+    return value
+
+
+def _arrow_csv_compatible(df: pd.DataFrame) -> bool:
+    """
+    pyarrow 写出结果与 to_csv 逐字节一致的情形：
+    列名唯一且为字符串、至少两列、各列为纯字符串或整数
+    （浮点、布尔、日期的格式化与 pandas 不同；单列时 csv 模块会给空串加引号）
+    """
+    if df.shape[1] < 2 or not df.columns.is_unique:
+        return False
+    if not all(isinstance(name, str) for name in df.columns):
+        return False
+    for _, col in df.items():
+        if pd.api.types.is_integer_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+            continue
+        if pd.api.types.infer_dtype(col, skipna=True) not in ("string", "empty"):
+            return False
+    return True
 
 
 class Exporter:
-    """导出器"""
+    """导出器（一个 run 共用一个实例，重名 CSV 的 dup 序号在实例内累计）"""
     
     def __init__(self, run_dir: Path, config):
         self.run_dir = run_dir
         self.config = config
         self.csv_dir = run_dir / DIR_CSV
         self.artifacts_dir = run_dir / DIR_ARTIFACTS
+        # csv_dir 连带创建 run_dir，artifacts_dir 只需再建一层
         self.csv_dir.mkdir(parents=True, exist_ok=True)
-        self.artifacts_dir.mkdir(parents=True, exist_ok=True)
+        self.artifacts_dir.mkdir(exist_ok=True)
+        # (文件名, 时间戳) → 下一个尝试的 dup 序号（0 表示不带后缀）
+        self._name_counter: Dict[Tuple[str, str], int] = defaultdict(int)
     
     def export_csv(self, df: pd.DataFrame, table_name: str, 
                    timestamp: datetime) -> Path:
@@ -38,36 +101,81 @@ class Exporter:
         # 生成时间戳字符串
         ts_str = timestamp.strftime(RUN_TS_FORMAT)
         
-        # 构建文件名
-        filename = f"{safe_name}_{ts_str}.csv"
-        
-        # 检查冲突并处理
-        csv_path = self.csv_dir / filename
-        counter = 1
-        while csv_path.exists():
-            base_name = safe_name
-            if base_name.endswith(f"_dup{counter - 1}"):
-                base_name = base_name.rsplit("_dup", 1)[0]
-            filename = f"{base_name}_dup{counter}_{ts_str}.csv"
-            csv_path = self.csv_dir / filename
-            counter += 1
-        
         # 导出 CSV
         try:
-            df.to_csv(
-                csv_path,
-                encoding=self.config.csv_encoding,
-                index=self.config.csv_index,
-                na_rep=self.config.csv_na_rep,
-                sep=CSV_DELIMITER,
-                lineterminator=CSV_LINE_TERMINATOR
-            )
+            csv_path = self._reserve_csv_path(safe_name, ts_str)
+            if self._use_arrow_csv(df) and self._write_csv_arrow(df, csv_path):
+                return csv_path.relative_to(self.run_dir)
+            # to_csv 本身按行块格式化写出；大缓冲区减少 write 系统调用
+            with open(csv_path, "w", encoding=self.config.csv_encoding, newline="",
+                      buffering=_WRITE_BUFFER_SIZE) as f:
+                df.to_csv(
+                    f,
+                    index=self.config.csv_index,
+                    na_rep=self.config.csv_na_rep,
+                    sep=CSV_DELIMITER,
+                    lineterminator=CSV_LINE_TERMINATOR
+                )
         except Exception as e:
             raise OutputWriteError(f"Failed to export CSV: {str(e)}")
         
         # 返回相对路径
         return csv_path.relative_to(self.run_dir)
     
+    def _reserve_csv_path(self, safe_name: str, ts_str: str) -> Path:
+        """
+        以 O_CREAT|O_EXCL 原子地占用文件名，冲突时依次改用 {name}_dup{k}_{ts}.csv
+        同一 Exporter 内记录每个名字下一个可用的序号，重名表不必从头逐个探测
+        """
+        key = (safe_name, ts_str)
+        counter = self._name_counter[key]
+        while True:
+            if counter == 0:
+                filename = f"{safe_name}_{ts_str}.csv"
+            else:
+                filename = f"{safe_name}_dup{counter}_{ts_str}.csv"
+            csv_path = self.csv_dir / filename
+            try:
+                os.close(os.open(csv_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            except FileExistsError:
+                counter += 1
+                continue
+            self._name_counter[key] = counter + 1
+            return csv_path
+    
+    def _use_arrow_csv(self, df: pd.DataFrame) -> bool:
+        """是否走 pyarrow 写出：需开启 fast_export 且已安装、UTF-8、无索引、空值输出为空串"""
+        return (
+            self.config.fast_export
+            and pa is not None
+            and self.config.csv_encoding.lower().replace("-", "") == "utf8"
+            and not self.config.csv_index
+            and self.config.csv_na_rep == ""
+            and _arrow_csv_compatible(df)
+        )
+    
+    def _write_csv_arrow(self, df: pd.DataFrame, csv_path: Path) -> bool:
+        """
+        用 pyarrow 按列写出 CSV（不加引号）
+        返回 False 表示含分隔符/引号/换行等需要转义的值，调用方改用 to_csv
+        """
+        # pyarrow 总会给表头加引号，表头由这里按 to_csv 的格式写出
+        if any(ch in name for name in df.columns for ch in (CSV_DELIMITER, '"', "\n", "\r")):
+            return False
+        header = CSV_DELIMITER.join(df.columns) + CSV_LINE_TERMINATOR
+        
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with open(csv_path, "wb", buffering=_WRITE_BUFFER_SIZE) as f:
+                f.write(header.encode("utf-8"))
+                pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(
+                    include_header=False, delimiter=CSV_DELIMITER, quoting_style="none",
+                    batch_size=_ARROW_CSV_BATCH_ROWS
+                ))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return False
+        return True
+    
     def export_metadata(self, metas: Dict[str, TableMeta]):
         """
         导出元数据 JSON
@@ -98,10 +206,16 @@ class Exporter:
                 "notes": meta.notes,
             }
         
+        metadata_dict = _json_safe(metadata_dict)
         metadata_path = self.artifacts_dir / "tables_meta.json"
         try:
-            with open(metadata_path, "w", encoding="utf-8") as f:
-                json.dump(metadata_dict, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                with open(metadata_path, "wb") as f:
+                    f.write(orjson.dumps(metadata_dict, option=orjson.OPT_INDENT_2
+                                         | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                with open(metadata_path, "w", encoding="utf-8") as f:
+                    json.dump(metadata_dict, f, ensure_ascii=False, indent=2)
         except Exception as e:
             raise OutputWriteError(f"Failed to export metadata: {str(e)}")
     
@@ -113,9 +227,9 @@ class Exporter:
         
         manifest_dict = {
             "run_id": manifest.run_id,
-            "source": manifest.source,
+            "source": str(manifest.source),
             "format": manifest.format.value,
-            "sheets": manifest.sheets,
+            "sheets": list(manifest.sheets) if manifest.sheets is not None else None,
             "config_profile": manifest.config_profile,
             "started_at_utc": manifest.started_at_utc,
             "finished_at_utc": manifest.finished_at_utc,
@@ -134,7 +248,7 @@ class Exporter:
         
         try:
             with open(manifest_path, "w", encoding="utf-8") as f:
-                yaml.dump(manifest_dict, f, allow_unicode=True, default_flow_style=False)
+                yaml.dump(manifest_dict, f, Dumper=_YAML_DUMPER, allow_unicode=True, default_flow_style=False)
         except Exception as e:
             raise OutputWriteError(f"Failed to export manifest: {str(e)}")
     
@@ -145,9 +259,8 @@ class Exporter:
         if not self.config.sanitize_file_name:
             return name
         
-        # 替换非法字符
-        for char in INVALID_FILENAME_CHARS:
-            name = name.replace(char, "_")
+        # 替换非法字符（一次 translate 扫描）
+        name = name.translate(_INVALID_CHARS_TABLE)
         
         # 去除首尾空白
         name = name.strip()
@@ -1,20 +1,120 @@
 """
 文件读取器 - 支持 xlsx/xlsb/csv
 """
+import codecs
+import itertools
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
-import openpyxl
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Any
 from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
 try:
     import pyxlsb
 except ImportError:
     pyxlsb = None
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
+try:
+    import chardet
+except ImportError:
+    chardet = None
+try:
+    from lxml import etree as ElementTree  # C 实现的 iterparse；openpyxl 检测到 lxml 时同样会使用
+except ImportError:
+    from xml.etree import ElementTree
 
-from .models import FileFormat
+from .models import FileFormat, BorderMetadata, StyleMetadata
+from .preprocessor import ref_boundaries
 from .exceptions import UnsupportedFormatError, FileReadError, InvalidArgumentError
 
 
+# sheet XML 结构扫描：<row>/<col>/<mergeCell> 起始标签（允许命名空间前缀）及其属性
+_STRUCTURE_TAG_RE = re.compile(rb"<(?:[\w.-]+:)?(row|col|mergeCell)(\s[^>]*)?/?>")
+_XML_ATTR_RE = re.compile(rb"""([\w:.-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_XML_SCAN_CHUNK = 1 << 20
+
+# 边框方向及其在扫描位掩码中的位
+_BORDER_BITS = ((1, "left"), (2, "right"), (4, "top"), (8, "bottom"))
+
+# CSV 候选编码（按尝试顺序）；chardet 探测结果只用于在这些候选中调整顺序
+_CSV_ENCODINGS = ("utf-8", "gbk", "gb2312", "latin-1")
+_CHARDET_ENCODINGS = {"gb2312": "gbk", "gbk": "gbk", "gb18030": "gbk",
+                      "iso-8859-1": "latin-1", "windows-1252": "latin-1"}
+# BOM → 编码（UTF-32 LE 的 BOM 以 UTF-16 LE 的 BOM 开头，需先判断）
+_CSV_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+_CSV_SNIFF_BYTES = 1 << 20
+_CHARDET_SAMPLE_BYTES = 1 << 16
+_ARROW_CSV_BLOCK_SIZE = 1 << 20
+
+# Excel 1900 日期系统的序列号零点（calamine 读 xlsb 时把日期还原为序列号）
+# Excel 把 1900 年当作闰年（序列号 60 为不存在的 1900-02-29），1900-03-01 之前的日期零点要晚一天
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_EXCEL_EPOCH_BEFORE_LEAP = datetime(1899, 12, 31)
+_EXCEL_LEAP_BUG_END = datetime(1900, 3, 1)
+_ONE_DAY = timedelta(days=1)
+
+# 整数值浮点数转 int 的上限：≥1e16 的数在 XML 中按科学计数法写入（如 1e+20），openpyxl 读为 float
+_CALAMINE_INT_LIMIT = 1e16
+
+# 默认填充的前景色，与普通模式下未写入单元格的取值一致
+_DEFAULT_BG_COLOR = str(PatternFill().start_color.rgb)
+
+
+def _rows_to_dataframe(data: Sequence[Sequence[Any]], n_cols: Optional[int] = None,
+                       trim_empty: bool = False) -> pd.DataFrame:
+    """
+    按行序列（list/tuple）转 DataFrame：写入预分配的 object 数组（短行右侧为 None），再按列推断类型
+    结果与 pd.DataFrame(补齐后的 data) 一致，省去逐行补齐产生的列表副本
+    trim_empty: 裁掉末尾全为 None 的行和列（只裁右下，保留左上以对齐元数据坐标）
+    """
+    if not data:
+        return pd.DataFrame()
+    lengths = [len(row) for row in data]
+    if n_cols is None:
+        n_cols = max(lengths)
+    
+    if min(lengths) == n_cols:
+        # 各行等长（values_only 读取有 <dimension> 的 sheet 时即如此）：整块写入，无需补齐
+        arr = np.empty((len(data), n_cols), dtype=object)
+        arr[:] = data
+    else:
+        arr = np.full((len(data), n_cols), None, dtype=object)
+        for r, row in enumerate(data):
+            arr[r, :len(row)] = row
+    if trim_empty:
+        arr = _trim_trailing_empty(arr)
+    return pd.DataFrame(arr, copy=False).infer_objects()
+
+
+def _trim_trailing_empty(arr: np.ndarray) -> np.ndarray:
+    """去掉末尾全为 None 的行列（陈旧格式常使 max_row/max_column 远大于实际数据区）"""
+    mask = arr != None  # 逐元素比较，不能写成 is not None
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    n_rows = rows[-1] + 1 if rows.size else 0
+    n_cols = cols[-1] + 1 if cols.size else 0
+    return arr[:n_rows, :n_cols]
+
+
 def detect_format(file_path: str) -> FileFormat:
     """检测文件格式"""
     ext = Path(file_path).suffix.lower()
@@ -28,201 +128,567 @@ def detect_format(file_path: str) -> FileFormat:
         raise UnsupportedFormatError(f"Unsupported file extension: {ext}")
 
 
+def _local_name(tag: str) -> str:
+    """去掉 XML 命名空间前缀"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _xlsx_sheet_paths(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """
+    解析 workbook.xml 及其关系文件，返回 {sheet 名: 包内 XML 路径}
+    """
+    rels = {}
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        for _, elem in ElementTree.iterparse(f):
+            if _local_name(elem.tag) == "Relationship":
+                target = elem.get("Target", "")
+                # Target 可能是绝对路径（/xl/...）或相对 xl/ 的路径
+                rels[elem.get("Id")] = target.lstrip("/") if target.startswith("/") else "xl/" + target
+    
+    paths = {}
+    with zf.open("xl/workbook.xml") as f:
+        for _, elem in ElementTree.iterparse(f):
+            if _local_name(elem.tag) == "sheet":
+                rid = next((v for k, v in elem.attrib.items() if _local_name(k) == "id"), None)
+                if rid in rels:
+                    paths[elem.get("name")] = rels[rid]
+    return paths
+
+
+def _read_xlsx_sheet_structure(file_path: str, sheet_name: str,
+                               include_hidden: bool) -> Tuple[List[Dict[str, int]], set, set]:
+    """
+    流式扫描 sheet XML，只取合并单元格和隐藏行列（read_only 模式下 openpyxl 不提供这些信息）
+    只对 <row>/<col>/<mergeCell> 起始标签做正则匹配，不为单元格构建 XML 元素
+    返回: (merged_cells, hidden_rows, hidden_cols)，均为 0-based
+    """
+    merged_cells = []
+    hidden_rows = set()
+    hidden_cols = set()
+    
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_path = _xlsx_sheet_paths(zf).get(sheet_name)
+        if sheet_path is None:
+            return merged_cells, hidden_rows, hidden_cols
+        
+        row_number = 0  # <row> 的 r 属性可省略，此时按顺序递增
+        tail = b""
+        with zf.open(sheet_path) as f:
+            while True:
+                chunk = f.read(_XML_SCAN_CHUNK)
+                buf = tail + chunk
+                # 标签可能跨块：最后一个 '<' 之后的部分留到下一块
+                cut = len(buf) if not chunk else buf.rfind(b"<")
+                if cut < 0:
+                    cut = 0
+                tail = buf[cut:]
+                
+                for match in _STRUCTURE_TAG_RE.finditer(buf, 0, cut):
+                    tag = match.group(1)
+                    attrs = {m.group(1): m.group(2) if m.group(2) is not None else m.group(3)
+                             for m in _XML_ATTR_RE.finditer(match.group(2) or b"")}
+                    hidden = attrs.get(b"hidden") in (b"1", b"true")
+                    
+                    if tag == b"row":
+                        row_number = int(attrs[b"r"]) if b"r" in attrs else row_number + 1
+                        if hidden and not include_hidden:
+                            hidden_rows.add(row_number - 1)
+                    elif tag == b"col":
+                        if hidden and not include_hidden:
+                            hidden_cols.update(range(int(attrs[b"min"]) - 1, int(attrs[b"max"])))
+                    else:  # mergeCell
+                        min_col, min_row, max_col, max_row = ref_boundaries(attrs[b"ref"].decode())
+                        merged_cells.append({
+                            "min_row": min_row - 1,  # 转为0-based
+                            "max_row": max_row - 1,
+                            "min_col": min_col - 1,
+                            "max_col": max_col - 1,
+                        })
+                
+                if not chunk:
+                    break
+    
+    return merged_cells, hidden_rows, hidden_cols
+
+
+def _calamine_value(val: Any) -> Any:
+    """
+    calamine 单元格值转为与 openpyxl 一致的形式：空串为 None，整数值的浮点数为 int，
+    纯日期（calamine 返回 date）为当天 0 点的 datetime（openpyxl 的日期单元总是 datetime）
+    calamine 的空单元与空字符串都是 ""（只含空白的内联字符串也被读成 ""），无法区分，都读为 None
+    """
+    if val == "":
+        return None
+    if isinstance(val, float) and val.is_integer() and abs(val) < _CALAMINE_INT_LIMIT:
+        return int(val)
+    if type(val) is date:
+        return datetime.combine(val, time())
+    return val
+
+
+def _excel_serial(val: datetime) -> float:
+    """datetime -> Excel 1900 日期系统的序列号（含 1900 闰年错误；序列号 60 无法还原，calamine 已读成 2 月 28 日）"""
+    epoch = _EXCEL_EPOCH if val >= _EXCEL_LEAP_BUG_END else _EXCEL_EPOCH_BEFORE_LEAP
+    return (val - epoch) / _ONE_DAY
+
+
+def _calamine_xlsb_value(val: Any) -> Any:
+    """
+    calamine 单元格值转为与 pyxlsb 一致的形式：空串为 None，数字保持浮点数，
+    日期/时间还原为 Excel 序列号（pyxlsb 不做日期转换，按 1900 日期系统）
+    错误单元 calamine 读为 ""，因此为 None（pyxlsb 为十六进制错误码字符串，如 '0x7'）
+    """
+    if val == "":
+        return None
+    if isinstance(val, datetime):
+        return _excel_serial(val)
+    if isinstance(val, date):
+        return _excel_serial(datetime.combine(val, time()))
+    if isinstance(val, time):
+        return (val.hour * 3600 + val.minute * 60 + val.second + val.microsecond / 1e6) / 86400
+    if isinstance(val, timedelta):
+        return val / _ONE_DAY
+    return val
+
+
+def _read_values_calamine(wb, sheet_name: str, max_rows: Optional[int] = None,
+                          max_cols: Optional[int] = None,
+                          convert: Callable[[Any], Any] = _calamine_value) -> List[List[Any]]:
+    """
+    从已打开的 calamine workbook 读取 sheet 的值（按行列表，保留左上角空白区域以对齐坐标；不负责关闭 wb）
+    max_rows: 只物化前 max_rows 行（to_python 的 nrows），其后的行不转成 Python 对象
+    convert: 单元格值转换，xlsx 对齐 openpyxl（默认），xlsb 对齐 pyxlsb（_calamine_xlsb_value）
+    """
+    if sheet_name not in wb.sheet_names:
+        raise FileReadError(f"Sheet '{sheet_name}' not found in file")
+    
+    rows = wb.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False, nrows=max_rows or None)
+    return [[convert(v) for v in (row[:max_cols] if max_cols else row)] for row in rows]
+
+
+def _open_calamine(file_path: str, format: FileFormat):
+    """用 calamine 打开 xlsx/xlsb，同一文件的多个 sheet 共用"""
+    try:
+        return python_calamine.CalamineWorkbook.from_path(file_path)
+    except Exception as e:
+        raise FileReadError(f"Failed to read {format.value} file: {str(e)}")
+
+
+def _read_xlsx_values(ws, min_row: int, max_row: Optional[int],
+                      max_cols: Optional[int]) -> List[Tuple[Any, ...]]:
+    """
+    只读取值（values_only=True），行号从 min_row 开始（1-based）；直接保留 openpyxl 返回的行元组
+    不向 iter_rows 传 max_col（否则每行都会补齐到 max_col 宽），超出 max_cols 的部分逐行截断
+    """
+    rows = ws.iter_rows(min_row=min_row, max_row=max_row, min_col=1, values_only=True)
+    if max_cols:
+        return [row[:max_cols] for row in rows]
+    return list(rows)
+
+
+def _style_tables(wb) -> Tuple[List[int], List[bool], List[Optional[str]]]:
+    """
+    按单元格样式 id（wb._cell_styles 的下标）预先算好边框位掩码、加粗、背景色，
+    扫描时每个单元只需一次下标查表，不必经 cell.border/font/fill 逐层取样式对象
+    末尾多一项（下标 -1）对应只读模式下 XML 中不存在的单元格（EmptyCell）
+    """
+    masks, bolds, colors = [], [], []
+    for style in wb._cell_styles:
+        border = wb._borders[style.borderId]
+        mask = 0
+        if border:
+            for bit, side in _BORDER_BITS:
+                # 某一侧可能缺省为 None（如只设置了 left 的 Border）
+                if getattr(getattr(border, side), "style", None):
+                    mask |= bit
+        masks.append(mask)
+        
+        font = wb._fonts[style.fontId]
+        bolds.append(bool(font and font.bold))
+        
+        fill = wb._fills[style.fillId]
+        colors.append(str(fill.start_color.rgb) if fill.start_color and fill.start_color.rgb else None)
+    
+    # EmptyCell：无边框、不加粗，普通模式下为默认填充
+    masks.append(0)
+    bolds.append(False)
+    colors.append(_DEFAULT_BG_COLOR)
+    return masks, bolds, colors
+
+
+def _scan_xlsx_rows(ws, max_row: Optional[int], max_cols: Optional[int],
+                    enable_border_scan: bool, enable_style_scan: bool
+                    ) -> Tuple[List[List[Any]], List[List[int]], List[List[bool]], List[List[Optional[str]]]]:
+    """
+    读取前 max_row 行，取值的同时逐行收集边框/样式
+    返回: (值, 边框位掩码, 加粗, 背景色)，后三者与值逐行对齐（对应扫描关闭时为空列表）
+    """
+    masks, bolds, colors = _style_tables(ws.parent)
+    data = []
+    border_rows = []
+    bold_rows = []
+    bg_rows = []
+    rows = ws.iter_rows(min_row=1, max_row=max_row, min_col=1, values_only=False)
+    for row in rows:
+        if max_cols and len(row) > max_cols:
+            row = row[:max_cols]
+        
+        data.append([cell.value for cell in row])
+        # EmptyCell 没有 _style_id，取 -1 对应查表末项
+        style_ids = [getattr(cell, "_style_id", -1) for cell in row]
+        
+        # 边框（仅在启用时扫描）
+        if enable_border_scan:
+            border_rows.append([masks[i] for i in style_ids])
+        
+        # 样式（仅在启用时扫描）
+        if enable_style_scan:
+            bold_rows.append([bolds[i] for i in style_ids])
+            bg_rows.append([colors[i] for i in style_ids])
+    
+    return data, border_rows, bold_rows, bg_rows
+
+
+def _pack_rows(rows: List[List[Any]], n_cols: int, dtype, fill: Any) -> np.ndarray:
+    """按行列表写入 (行数, n_cols) 矩阵，短行右侧为 fill"""
+    arr = np.full((len(rows), n_cols), fill, dtype=dtype)
+    for r, row in enumerate(rows):
+        arr[r, :len(row)] = row
+    return arr
+
+
+def _border_metadata(border_rows: List[List[int]], n_cols: int) -> BorderMetadata:
+    """边框位掩码（逐行）→ BorderMetadata"""
+    masks = _pack_rows(border_rows, n_cols, np.uint8, 0)
+    return BorderMetadata(**{side: (masks & bit) != 0 for bit, side in _BORDER_BITS})
+
+
+def _use_calamine(engine: str, enable_style_scan: bool, enable_border_scan: bool) -> bool:
+    """是否用 calamine 读取 xlsx 的值：需已安装且样式与边框扫描均关闭"""
+    return engine == "calamine" and python_calamine is not None and not (enable_style_scan or enable_border_scan)
+
+
+def _open_xlsx(file_path: str):
+    """
+    以只读模式打开 xlsx，同一文件的多个 sheet 共用
+    不保留外部链接与 VBA、不解析富文本（只需要单元格的值）
+    """
+    try:
+        return load_workbook(file_path, data_only=True, read_only=True,
+                             keep_links=False, keep_vba=False, rich_text=False)
+    except Exception as e:
+        raise FileReadError(f"Failed to read xlsx file: {str(e)}")
+
+
 def read_xlsx_sheet(file_path: str, sheet_name: str, include_hidden: bool = False, 
                    max_rows: Optional[int] = None, max_cols: Optional[int] = None,
                    enable_style_scan: bool = True, enable_border_scan: bool = True,
-                   style_scan_limit: Optional[int] = None, border_scan_limit: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+                   style_scan_limit: Optional[int] = None, border_scan_limit: Optional[int] = None,
+                   engine: str = "openpyxl", trim_empty: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     读取 xlsx 文件的指定 sheet（单个 sheet）
     返回: (DataFrame, metadata_dict)
     metadata 包含: borders, styles, merged_cells, hidden_rows, hidden_cols
+    engine: "calamine" 且已安装 python-calamine、样式与边框扫描均关闭时，用 calamine 读取值；
+            否则使用 openpyxl（样式信息只能由 openpyxl 提供）
+            与 openpyxl 的差异：空字符串/只含空白的字符串单元格读为 None；
+            只有格式没有值的单元格不计入 sheet 尺寸（相当于总是 trim_empty）
+    trim_empty: 裁掉末尾全空的行列
     """
+    if _use_calamine(engine, enable_style_scan, enable_border_scan):
+        with _open_calamine(file_path, FileFormat.xlsx) as wb:
+            return _read_xlsx_sheet_calamine(wb, file_path, sheet_name, include_hidden,
+                                             max_rows=max_rows, max_cols=max_cols, trim_empty=trim_empty)
+    
+    wb = _open_xlsx(file_path)
     try:
-        # 使用普通模式（read_only=False）以确保能访问所有属性
-        # 虽然速度稍慢，但能保证功能完整性
-        wb = load_workbook(file_path, data_only=True, read_only=False)
+        return _read_xlsx_sheet_from_wb(
+            wb, file_path, sheet_name, include_hidden,
+            max_rows=max_rows, max_cols=max_cols,
+            enable_style_scan=enable_style_scan,
+            enable_border_scan=enable_border_scan,
+            style_scan_limit=style_scan_limit,
+            border_scan_limit=border_scan_limit,
+            trim_empty=trim_empty,
+        )
+    finally:
+        wb.close()
+
+
+def _read_xlsx_sheet_calamine(wb, file_path: str, sheet_name: str, include_hidden: bool = False,
+                              max_rows: Optional[int] = None, max_cols: Optional[int] = None,
+                              trim_empty: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    从已打开的 calamine workbook 读取 xlsx sheet 的值（不负责关闭 wb）
+    合并单元格与隐藏行列另从 sheet XML 扫描
+    """
+    try:
+        df = _rows_to_dataframe(_read_values_calamine(wb, sheet_name, max_rows, max_cols),
+                                trim_empty=trim_empty)
         
+        merged_cells, hidden_rows, hidden_cols = _read_xlsx_sheet_structure(file_path, sheet_name, include_hidden)
+        metadata = {
+            "borders": BorderMetadata.empty(),
+            "styles": StyleMetadata.empty(),
+            "merged_cells": merged_cells,
+            "hidden_rows": hidden_rows,
+            "hidden_cols": {c for c in hidden_cols if c < df.shape[1]},
+        }
+        return df, metadata
+    
+    except Exception as e:
+        raise FileReadError(f"Failed to read xlsx file: {str(e)}")
+
+
+def _read_xlsx_sheet_from_wb(wb, file_path: str, sheet_name: str, include_hidden: bool = False,
+                             max_rows: Optional[int] = None, max_cols: Optional[int] = None,
+                             enable_style_scan: bool = True, enable_border_scan: bool = True,
+                             style_scan_limit: Optional[int] = None,
+                             border_scan_limit: Optional[int] = None,
+                             trim_empty: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    从已打开的只读 workbook 读取指定 sheet（不负责关闭 wb）
+    file_path 用于流式扫描 sheet XML 中的合并单元格与隐藏行列
+    """
+    scan = enable_border_scan or enable_style_scan
+    try:
+        # 使用只读模式流式读取，内存占用与行数无关；
+        # 合并单元格与隐藏行列另行从 sheet XML 中流式扫描
         if sheet_name not in wb.sheetnames:
-            wb.close()
             raise FileReadError(f"Sheet '{sheet_name}' not found in file")
         
         ws = wb[sheet_name]
         
-        # 读取数据（应用限制）
-        data = []
-        original_max_row = ws.max_row or 0
-        original_max_col = ws.max_column or 0
-        
-        # 应用行数和列数限制
-        max_row = min(original_max_row, max_rows) if max_rows else original_max_row
-        max_col = min(original_max_col, max_cols) if max_cols else original_max_col
-        
-        # 使用 values_only=True 提升性能（只读取值，不读取样式）
-        for row_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col, values_only=True), start=1):
-            # values_only=True 时，row 直接是值列表
-            row_data = list(row)
-            data.append(row_data)
-        
-        # 转换为 DataFrame
-        if data:
-            # 确保所有行长度一致
-            max_len = max(len(row) for row in data) if data else 0
-            data = [row + [None] * (max_len - len(row)) for row in data]
-            df = pd.DataFrame(data)
-        else:
-            df = pd.DataFrame()
+        # 只读模式默认信任 <dimension> 标签，陈旧的声明会悄悄截掉数据：
+        # 一律忽略声明，按实际存在的行读取，只受调用方的行列数限制约束
+        ws.reset_dimensions()
+        max_row = max_rows or None
         
         # 收集元数据
         metadata = {
-            "borders": {},
-            "styles": {},
+            "borders": BorderMetadata.empty(),
+            "styles": StyleMetadata.empty(),
             "merged_cells": [],
             "hidden_rows": set(),
             "hidden_cols": set(),
         }
+        # 边框和样式（仅在启用时扫描，且限制扫描范围以提升性能）
+        scan_rows = max(
+            border_scan_limit if border_scan_limit else 0,
+            style_scan_limit if style_scan_limit else 0
+        ) or max_row  # None 表示不限
         
-        # 合并单元格（普通模式下可以直接访问）
-        try:
-            if hasattr(ws, 'merged_cells') and hasattr(ws.merged_cells, 'ranges'):
-                for merged_range in ws.merged_cells.ranges:
-                    metadata["merged_cells"].append({
-                        "min_row": merged_range.min_row - 1,  # 转为0-based
-                        "max_row": merged_range.max_row - 1,
-                        "min_col": merged_range.min_col - 1,
-                        "max_col": merged_range.max_col - 1,
-                    })
-        except (AttributeError, TypeError) as e:
-            # 如果无法获取合并单元格信息，继续执行
-            pass
+        # 扫描范围内的行逐单元读取值和样式；其余行（或未启用扫描时）走 values_only，不创建单元格对象
+        if scan:
+            styled_rows = min(scan_rows, max_row) if scan_rows and max_row else (scan_rows or max_row)
+            data, border_rows, bold_rows, bg_rows = _scan_xlsx_rows(
+                ws, styled_rows, max_cols, enable_border_scan, enable_style_scan)
+            if styled_rows and len(data) == styled_rows and (max_row is None or max_row > styled_rows):
+                data.extend(_read_xlsx_values(ws, styled_rows + 1, max_row, max_cols))
+        else:
+            data = _read_xlsx_values(ws, 1, max_row, max_cols)
         
-        # 隐藏行列
-        if not include_hidden:
-            for row_idx, row in enumerate(ws.iter_rows(), start=1):
-                if row and hasattr(row[0], 'row') and ws.row_dimensions[row[0].row].hidden:
-                    metadata["hidden_rows"].add(row_idx - 1)  # 0-based
-            
-            for col_idx in range(1, max_col + 1):
-                if ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].hidden:
-                    metadata["hidden_cols"].add(col_idx - 1)  # 0-based
+        # 转换为 DataFrame（短行右侧补 None）
+        max_len = max((len(row) for row in data), default=0)
+        if scan and enable_border_scan:
+            metadata["borders"] = _border_metadata(border_rows, max_len)
+        if scan and enable_style_scan:
+            # 无 <dimension> 时各行长度不一；补齐的单元在普通模式下同样是默认填充
+            metadata["styles"] = StyleMetadata(
+                bold=_pack_rows(bold_rows, max_len, bool, False),
+                bg_color=_pack_rows(bg_rows, max_len, object, _DEFAULT_BG_COLOR),
+            )
+        df = _rows_to_dataframe(data, max_len, trim_empty=trim_empty)
         
-        # 边框和样式（仅在启用时扫描，且限制扫描范围以提升性能）
-        if enable_border_scan or enable_style_scan:
-            scan_limit = max(
-                border_scan_limit if border_scan_limit else 0,
-                style_scan_limit if style_scan_limit else 0
-            ) or max_row
-            
-            scan_rows = min(scan_limit, max_row)
-            
-            for row_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=scan_rows, min_col=1, max_col=max_col, values_only=False), start=1):
-                for col_idx, cell in enumerate(row, start=1):
-                    key = (row_idx - 1, col_idx - 1)  # 0-based
-                    
-                    # 边框（仅在启用时扫描）
-                    if enable_border_scan:
-                        if cell.border and cell.border.left.style:
-                            if key not in metadata["borders"]:
-                                metadata["borders"][key] = {}
-                            metadata["borders"][key]["left"] = cell.border.left.style is not None
-                        if cell.border and cell.border.right.style:
-                            if key not in metadata["borders"]:
-                                metadata["borders"][key] = {}
-                            metadata["borders"][key]["right"] = cell.border.right.style is not None
-                        if cell.border and cell.border.top.style:
-                            if key not in metadata["borders"]:
-                                metadata["borders"][key] = {}
-                            metadata["borders"][key]["top"] = cell.border.top.style is not None
-                        if cell.border and cell.border.bottom.style:
-                            if key not in metadata["borders"]:
-                                metadata["borders"][key] = {}
-                            metadata["borders"][key]["bottom"] = cell.border.bottom.style is not None
-                    
-                    # 样式（仅在启用时扫描）
-                    if enable_style_scan:
-                        if cell.font and cell.font.bold:
-                            if key not in metadata["styles"]:
-                                metadata["styles"][key] = {}
-                            metadata["styles"][key]["bold"] = True
-                        if cell.fill and cell.fill.start_color and cell.fill.start_color.rgb:
-                            if key not in metadata["styles"]:
-                                metadata["styles"][key] = {}
-                            metadata["styles"][key]["bg_color"] = str(cell.fill.start_color.rgb)
+        # 合并单元格与隐藏行列
+        merged_cells, hidden_rows, hidden_cols = _read_xlsx_sheet_structure(file_path, sheet_name, include_hidden)
+        metadata["merged_cells"] = merged_cells
+        metadata["hidden_rows"] = hidden_rows
+        metadata["hidden_cols"] = {c for c in hidden_cols if c < df.shape[1]}
         
-        wb.close()
         return df, metadata
     
     except Exception as e:
         raise FileReadError(f"Failed to read xlsx file: {str(e)}")
 
 
-def read_xlsb_sheet(file_path: str, sheet_name: str, include_hidden: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+def read_xlsb_sheet(file_path: str, sheet_name: str, include_hidden: bool = False,
+                    trim_empty: bool = False, engine: str = "openpyxl",
+                    max_rows: Optional[int] = None, max_cols: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     读取 xlsb 文件的指定 sheet
+    engine: "calamine" 且已安装 python-calamine 时用 calamine 读取，否则使用 pyxlsb（默认）
+            与 pyxlsb 的差异：错误单元为 None（pyxlsb 为 '0x7' 等错误码）；序列号 60（1900-02-29）读为 59；
+            sheet 尺寸只到最后一个有值的单元（pyxlsb 每行补齐到 dimension 声明的宽度）
+    max_rows/max_cols: 只读取前若干行/列（与 xlsx 相同，超出部分截断）
     """
+    if engine == "calamine" and python_calamine is not None:
+        with _open_calamine(file_path, FileFormat.xlsb) as wb:
+            return _read_xlsb_sheet_calamine(wb, sheet_name, trim_empty=trim_empty,
+                                             max_rows=max_rows, max_cols=max_cols)
+    
     if pyxlsb is None:
         raise FileReadError("pyxlsb library not installed. Install with: pip install pyxlsb")
     
     try:
         with pyxlsb.open_workbook(file_path) as wb:
-            if sheet_name not in wb.sheets:
-                raise FileReadError(f"Sheet '{sheet_name}' not found in file")
-            
-            ws = wb.get_sheet(sheet_name)
-            
-            # 读取数据
-            data = []
-            for row in ws.rows():
-                row_data = [item.v for item in row]
-                data.append(row_data)
-            
-            # 转换为 DataFrame
-            if data:
-                max_len = max(len(row) for row in data) if data else 0
-                data = [row + [None] * (max_len - len(row)) for row in data]
-                df = pd.DataFrame(data)
-            else:
-                df = pd.DataFrame()
-            
-            # xlsb 格式元数据较少
-            metadata = {
-                "borders": {},
-                "styles": {},
-                "merged_cells": [],
-                "hidden_rows": set(),
-                "hidden_cols": set(),
-            }
-            
-            return df, metadata
+            return _read_xlsb_sheet_from_wb(wb, sheet_name, trim_empty=trim_empty,
+                                            max_rows=max_rows, max_cols=max_cols)
     
     except Exception as e:
+        if isinstance(e, FileReadError):
+            raise
         raise FileReadError(f"Failed to read xlsb file: {str(e)}")
 
 
+def _read_xlsb_sheet_calamine(wb, sheet_name: str, trim_empty: bool = False,
+                              max_rows: Optional[int] = None,
+                              max_cols: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """从已打开的 calamine workbook 读取 xlsb sheet 的值（不负责关闭 wb）"""
+    try:
+        df = _rows_to_dataframe(_read_values_calamine(wb, sheet_name, max_rows, max_cols,
+                                                      convert=_calamine_xlsb_value),
+                                trim_empty=trim_empty)
+        
+        # xlsb 格式元数据较少
+        metadata = {
+            "borders": BorderMetadata.empty(),
+            "styles": StyleMetadata.empty(),
+            "merged_cells": [],
+            "hidden_rows": set(),
+            "hidden_cols": set(),
+        }
+        return df, metadata
+    
+    except Exception as e:
+        raise FileReadError(f"Failed to read xlsb file: {str(e)}")
+
+
+def _read_xlsb_sheet_from_wb(wb, sheet_name: str, trim_empty: bool = False,
+                             max_rows: Optional[int] = None,
+                             max_cols: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    从已打开的 pyxlsb workbook 读取指定 sheet（不负责关闭 wb）
+    max_rows/max_cols: 行流读到第 max_rows 行即停止，不再解析其后的记录
+    """
+    try:
+        if sheet_name not in wb.sheets:
+            raise FileReadError(f"Sheet '{sheet_name}' not found in file")
+        
+        with wb.get_sheet(sheet_name) as ws:
+            # 读取数据并转换为 DataFrame
+            rows = ws.rows()
+            if max_rows:
+                rows = itertools.islice(rows, max_rows)
+            df = _rows_to_dataframe([[item.v for item in (row[:max_cols] if max_cols else row)] for row in rows],
+                                    trim_empty=trim_empty)
+        
+        # xlsb 格式元数据较少
+        metadata = {
+            "borders": BorderMetadata.empty(),
+            "styles": StyleMetadata.empty(),
+            "merged_cells": [],
+            "hidden_rows": set(),
+            "hidden_cols": set(),
+        }
+        
+        return df, metadata
+    
+    except Exception as e:
+        raise FileReadError(f"Failed to read xlsb file: {str(e)}")
+
+
+def _sniff_encoding(head: bytes) -> str:
+    """
+    由文件头部推断编码：先看 BOM；否则头部是合法 UTF-8 即为 utf-8；
+    再否则装有 chardet 时取其在候选编码中的探测结果，默认 gbk
+    """
+    for bom, encoding in _CSV_BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        # final=False：容忍末尾被截断的多字节字符
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if chardet is not None:
+        guess = (chardet.detect(head[:_CHARDET_SAMPLE_BYTES]).get("encoding") or "").lower()
+        if guess in _CHARDET_ENCODINGS:
+            return _CHARDET_ENCODINGS[guess]
+    return "gbk"
+
+
+def _csv_encodings(file_path: str) -> List[str]:
+    """
+    CSV 候选编码：探测结果在前，其余默认候选（utf-8/gbk/gb2312/latin-1）依次兜底
+    头部探测只读前 1 MiB，通常一次即可解码成功
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(_CSV_SNIFF_BYTES)
+    encoding = _sniff_encoding(head)
+    return [encoding] + [e for e in _CSV_ENCODINGS if e != encoding]
+
+
+def _read_csv_arrow(file_path: str, encoding: str) -> Optional[pd.DataFrame]:
+    """
+    用 pyarrow.csv 多线程读取，所有列按字符串读入且不识别空值，
+    结果与 pd.read_csv(dtype=str, keep_default_na=False) 一致；
+    解码/解析失败或表头需要 pandas 改名（重复、空列名）时返回 None
+    """
+    read_options = pacsv.ReadOptions(encoding=encoding, block_size=_ARROW_CSV_BLOCK_SIZE)
+    parse_options = pacsv.ParseOptions(newlines_in_values=True)
+    try:
+        reader = pacsv.open_csv(
+            file_path, read_options=read_options, parse_options=parse_options,
+            convert_options=pacsv.ConvertOptions(null_values=[], strings_can_be_null=False),
+        )
+        names = reader.schema.names
+        reader.close()
+        if len(set(names)) != len(names) or "" in names:
+            return None
+        convert_options = pacsv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            null_values=[], strings_can_be_null=False, quoted_strings_can_be_null=False,
+        )
+        table = pacsv.read_csv(file_path, read_options=read_options,
+                               parse_options=parse_options, convert_options=convert_options)
+    except (pa.ArrowException, UnicodeDecodeError):
+        return None
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
 def read_csv_file(file_path: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     读取 CSV 文件
+    编码由 BOM 与文件头部探测；装有 pyarrow 时先用探测出的编码走 pyarrow.csv，
+    不适用时回退到 pandas，解码失败再依次尝试其余候选编码
     """
     try:
-        # 尝试多种编码
-        encodings = ["utf-8", "gbk", "gb2312", "latin-1"]
+        encodings = _csv_encodings(file_path)
         df = None
         last_error = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding, dtype=str, keep_default_na=False)
-                break
-            except UnicodeDecodeError as e:
-                last_error = e
-                continue
+
+        if pacsv is not None:
+            df = _read_csv_arrow(file_path, encodings[0])
+
+        if df is None:
+            for encoding in encodings:
+                try:
+                    df = pd.read_csv(file_path, encoding=encoding, dtype=str, keep_default_na=False,
+                                     engine="c", low_memory=False)
+                    break
+                except UnicodeDecodeError as e:
+                    last_error = e
+                    continue
         
         if df is None:
             raise FileReadError(f"Failed to decode CSV file with encodings: {encodings}. Last error: {last_error}")
         
         # CSV 没有样式和边框信息
         metadata = {
-            "borders": {},
-            "styles": {},
+            "borders": BorderMetadata.empty(),
+            "styles": StyleMetadata.empty(),
             "merged_cells": [],
             "hidden_rows": set(),
             "hidden_cols": set(),
@@ -240,9 +706,12 @@ def read_single_sheet(file_path: str, sheet_name: str, format: FileFormat,
                      include_hidden: bool = False, max_rows: Optional[int] = None, 
                      max_cols: Optional[int] = None, enable_style_scan: bool = True,
                      enable_border_scan: bool = True, style_scan_limit: Optional[int] = None,
-                     border_scan_limit: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+                     border_scan_limit: Optional[int] = None,
+                     engine: str = "openpyxl", trim_empty: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     读取单个 sheet（用于逐个处理，减少内存占用）
+    engine: xlsx 读取引擎，见 read_xlsx_sheet
+    trim_empty: 裁掉 xlsx/xlsb 末尾全空的行列（CSV 不适用）
     """
     if format == FileFormat.csv:
         if sheet_name != "__csv__":
@@ -255,23 +724,77 @@ def read_single_sheet(file_path: str, sheet_name: str, format: FileFormat,
             enable_style_scan=enable_style_scan,
             enable_border_scan=enable_border_scan,
             style_scan_limit=style_scan_limit,
-            border_scan_limit=border_scan_limit
+            border_scan_limit=border_scan_limit,
+            engine=engine,
+            trim_empty=trim_empty
         )
     elif format == FileFormat.xlsb:
-        return read_xlsb_sheet(file_path, sheet_name, include_hidden)
+        return read_xlsb_sheet(file_path, sheet_name, include_hidden, trim_empty=trim_empty, engine=engine,
+                               max_rows=max_rows, max_cols=max_cols)
     else:
         raise UnsupportedFormatError(f"Unsupported format: {format}")
 
 
+def _read_sheets(file_path: str, sheet_names: List[str], format: FileFormat,
+                 include_hidden: bool = False, engine: str = "openpyxl",
+                 **read_options) -> Dict[str, Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """
+    依次读取同一 xlsx/xlsb 文件的多个 sheet，workbook 只打开一次
+    （openpyxl 打开时解析共享字符串与样式表，是多 sheet 读取的主要固定开销）
+    """
+    result = {}
+    calamine_xlsx = format == FileFormat.xlsx and _use_calamine(
+        engine, read_options.get("enable_style_scan", True), read_options.get("enable_border_scan", True))
+    calamine_xlsb = format == FileFormat.xlsb and engine == "calamine" and python_calamine is not None
+    if calamine_xlsx or calamine_xlsb:
+        limits = dict(max_rows=read_options.get("max_rows"), max_cols=read_options.get("max_cols"),
+                      trim_empty=read_options.get("trim_empty", False))
+        with _open_calamine(file_path, format) as wb:
+            for sheet in sheet_names:
+                if calamine_xlsx:
+                    result[sheet] = _read_xlsx_sheet_calamine(wb, file_path, sheet, include_hidden, **limits)
+                else:
+                    result[sheet] = _read_xlsb_sheet_calamine(wb, sheet, **limits)
+    elif format == FileFormat.xlsx:
+        wb = _open_xlsx(file_path)
+        try:
+            for sheet in sheet_names:
+                result[sheet] = _read_xlsx_sheet_from_wb(wb, file_path, sheet, include_hidden, **read_options)
+        finally:
+            wb.close()
+    elif format == FileFormat.xlsb:
+        if pyxlsb is None:
+            raise FileReadError("pyxlsb library not installed. Install with: pip install pyxlsb")
+        try:
+            wb = pyxlsb.open_workbook(file_path)
+        except Exception as e:
+            raise FileReadError(f"Failed to read xlsb file: {str(e)}")
+        with wb:
+            for sheet in sheet_names:
+                result[sheet] = _read_xlsb_sheet_from_wb(
+                    wb, sheet, read_options.get("trim_empty", False),
+                    max_rows=read_options.get("max_rows"), max_cols=read_options.get("max_cols")
+                )
+    else:
+        for sheet in sheet_names:
+            result[sheet] = read_single_sheet(file_path, sheet, format, include_hidden,
+                                              engine=engine, **read_options)
+    return result
+
+
 def read_file(file_path: str, sheet_name: Optional[List[str]], format: Optional[FileFormat] = None, 
               include_hidden: bool = False, max_rows: Optional[int] = None, max_cols: Optional[int] = None,
               enable_style_scan: bool = True, enable_border_scan: bool = True,
-              style_scan_limit: Optional[int] = None, border_scan_limit: Optional[int] = None) -> Dict[str, Tuple[pd.DataFrame, Dict[str, Any]]]:
+              style_scan_limit: Optional[int] = None, border_scan_limit: Optional[int] = None,
+              engine: str = "openpyxl", workers: int = 0,
+              trim_empty: bool = False) -> Dict[str, Tuple[pd.DataFrame, Dict[str, Any]]]:
     """
     统一入口：读取文件并返回所有 sheet 的数据和元数据
     注意：此函数会一次性加载所有 sheet，对于大文件建议使用逐个处理模式
+    workers: 大于 1 且有多个 sheet 时，每个 sheet 在独立进程中读取（XML 解析受 GIL 限制，不用线程）
+    trim_empty: 裁掉 xlsx/xlsb 末尾全空的行列
     
-    返回: {sheet_name: (DataFrame, metadata)}
+    返回: {sheet_name: (DataFrame, metadata)}，顺序与 sheet_name 一致
     """
     if format is None:
         format = detect_format(file_path)
@@ -288,18 +811,31 @@ def read_file(file_path: str, sheet_name: Optional[List[str]], format: Optional[
         if not sheet_name or len(sheet_name) == 0:
             raise InvalidArgumentError("sheet_name is required for xlsx/xlsb files")
         
-        for sheet in sheet_name:
-            if format == FileFormat.xlsx:
-                df, metadata = read_xlsx_sheet(
-                    file_path, sheet, include_hidden,
-                    max_rows=max_rows, max_cols=max_cols,
-                    enable_style_scan=enable_style_scan,
-                    enable_border_scan=enable_border_scan,
-                    style_scan_limit=style_scan_limit,
-                    border_scan_limit=border_scan_limit
-                )
-            else:  # xlsb
-                df, metadata = read_xlsb_sheet(file_path, sheet, include_hidden)
-            result[sheet] = (df, metadata)
+        read_options = dict(
+            max_rows=max_rows, max_cols=max_cols,
+            enable_style_scan=enable_style_scan,
+            enable_border_scan=enable_border_scan,
+            style_scan_limit=style_scan_limit,
+            border_scan_limit=border_scan_limit,
+            engine=engine,
+            trim_empty=trim_empty
+        )
+        
+        if workers > 1 and len(sheet_name) > 1:
+            # 每个进程负责一组 sheet，只打开一次 workbook
+            n_workers = min(workers, len(sheet_name))
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                futures = [
+                    executor.submit(_read_sheets, file_path, sheet_name[i::n_workers], format,
+                                    include_hidden, **read_options)
+                    for i in range(n_workers)
+                ]
+                sheets = {}
+                for future in futures:
+                    sheets.update(future.result())
+            for sheet in sheet_name:
+                result[sheet] = sheets[sheet]
+        else:
+            result.update(_read_sheets(file_path, sheet_name, format, include_hidden, **read_options))
     
     return result
@@ -1,10 +1,77 @@
 """
 网格构建器 - 构建占用矩阵、边框图、样式图
 """
+import re
+
 import numpy as np
 import pandas as pd
-from typing import Dict, Tuple, Set, Any
-from .models import FileFormat
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Set, Any
+from .models import FileFormat, BorderMetadata, StyleMetadata
+
+
+@dataclass
+class Borders:
+    """
+    边框图（SoA）：四个方向各一张 (n_rows, n_cols) 的 uint8 矩阵，1 表示该侧有边框
+    整张 sheet 无边框时四个方向共用一个只读的全零广播视图（不占内存，见 Borders.none）
+    """
+    top: np.ndarray
+    right: np.ndarray
+    bottom: np.ndarray
+    left: np.ndarray
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.top.shape
+    
+    @property
+    def size(self) -> int:
+        return self.top.size
+    
+    @classmethod
+    def none(cls, shape: Tuple[int, int]) -> "Borders":
+        """无任何边框的边框图：只读零视图，读取/切片与普通矩阵一致"""
+        zeros = np.broadcast_to(np.zeros((), dtype=np.uint8), shape)
+        return cls(top=zeros, right=zeros, bottom=zeros, left=zeros)
+
+
+# 数字判断：去掉千分位/百分号/货币符号后整串为普通十进制数即为数字；
+# 否则仅在可能被 float() 接受（含数字或 nan/inf）时再交给 float() 判定
+_NUM_STRIP = str.maketrans("", "", ",%¥$")
+_NUM_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?", re.ASCII)
+_MAYBE_FLOAT_RE = re.compile(r"\d|nan|inf", re.IGNORECASE)
+# 日期特征字符
+_DATE_RE = re.compile(r"[-/:T年月日]")
+
+
+# 逐元素 str(val).strip()（返回 object 数组）
+_strip_str = np.frompyfunc(lambda val: str(val).strip(), 1, 1)
+# str.strip() 默认去除的全部空白字符（均不超过 U+3000）；显式传给 Series.str.strip，
+# 使 pyarrow 后端（utf8_trim）与 Python 的 str.strip() 去除同一组字符
+_WHITESPACE = "".join(ch for ch in map(chr, range(0x3001)) if ch.isspace())
+
+
+def _stripped_strings(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    返回 (notna 掩码, 逐单元 str(val).strip() 的 object 数组)
+    数值/布尔/日期列的非空值 str 后必非空串，不做字符串化；这些列及空值处为 None
+    """
+    notna = np.array(df.notna(), dtype=bool)  # to_numpy 在 copy-on-write 下可能返回只读视图
+    stripped = np.full(df.shape, None, dtype=object)
+    for c, dtype in enumerate(df.dtypes):
+        if dtype.kind in "biufcmM":
+            continue
+        rows = np.flatnonzero(notna[:, c])
+        if not rows.size:
+            continue
+        column = df.iloc[:, c]
+        if isinstance(dtype, pd.StringDtype):
+            # 字符串列（CSV 读入即为此类型）：整列向量化 strip，值本身就是 str
+            stripped[rows, c] = column.str.strip(_WHITESPACE).to_numpy(dtype=object)[rows]
+        else:
+            stripped[rows, c] = _strip_str(column.to_numpy(dtype=object)[rows])
+    return notna, stripped
 
 
 class GridBuilder:
@@ -15,54 +82,83 @@ class GridBuilder:
         self.metadata = metadata
         self.format = format
         self.n_rows, self.n_cols = df.shape
+        self._stripped: Optional[np.ndarray] = None
+        self._notna_count: Optional[int] = None
+        self._nonblank: Optional[np.ndarray] = None
+    
+    def _get_stripped(self) -> np.ndarray:
+        """逐单元 str(val).strip() 快照（占用矩阵与样式推断共用，只计算一次；见 _stripped_strings）"""
+        if self._stripped is None:
+            notna, self._stripped = _stripped_strings(self.df)
+            self._notna_count = int(np.count_nonzero(notna))
+            # pd.notna(val) and str(val).strip() != ""；None 处 != "" 为真，即只需判空
+            self._nonblank = notna & (self._stripped != "")
+        return self._stripped
         
+    def _get_nonblank_mask(self) -> np.ndarray:
+        """非空单元掩码（占用/类型/样式矩阵共用，只计算一次）"""
+        if self._nonblank is None:
+            self._get_stripped()
+        return self._nonblank
+    
+    def count_notna(self) -> int:
+        """非空值（pd.notna）单元数，复用占用矩阵所需的 notna 掩码"""
+        if self._notna_count is None:
+            self._get_stripped()
+        return self._notna_count
+    
     def build_occupancy_matrix(self) -> np.ndarray:
         """
         构建占用矩阵 O[r, c]: 非空单元为 1
         """
-        O = np.zeros((self.n_rows, self.n_cols), dtype=np.int8)
-        
-        for r in range(self.n_rows):
-            for c in range(self.n_cols):
-                val = self.df.iloc[r, c]
-                # 检查是否非空（排除 None, NaN, 空字符串）
-                if pd.notna(val) and str(val).strip() != "":
-                    O[r, c] = 1
+        O = self._get_nonblank_mask().astype(np.uint8)
         
         # 处理隐藏行列
         hidden_rows = self.metadata.get("hidden_rows", set())
         hidden_cols = self.metadata.get("hidden_cols", set())
         
-        for r in hidden_rows:
-            if 0 <= r < self.n_rows:
-                O[r, :] = 0
-        
-        for c in hidden_cols:
-            if 0 <= c < self.n_cols:
-                O[:, c] = 0
+        hr = np.fromiter((r for r in hidden_rows if 0 <= r < self.n_rows), dtype=np.int64)
+        hc = np.fromiter((c for c in hidden_cols if 0 <= c < self.n_cols), dtype=np.int64)
+        if hr.size:
+            O[hr, :] = 0
+        if hc.size:
+            O[:, hc] = 0
         
         return O
     
-    def build_border_matrix(self) -> np.ndarray:
+    def build_border_matrix(self) -> Borders:
         """
-        构建边框矩阵 B[r, c]: 每个位置记录是否有上下左右边框
-        返回形状: (n_rows, n_cols, 4) - [top, right, bottom, left]
+        构建边框图 Borders: 每个方向一张矩阵，记录单元格该侧是否有边框
         """
-        B = np.zeros((self.n_rows, self.n_cols, 4), dtype=np.int8)
+        shape = (self.n_rows, self.n_cols)
         borders = self.metadata.get("borders", {})
         
-        for (r, c), border_info in borders.items():
-            if 0 <= r < self.n_rows and 0 <= c < self.n_cols:
-                if border_info.get("top"):
-                    B[r, c, 0] = 1
-                if border_info.get("right"):
-                    B[r, c, 1] = 1
-                if border_info.get("bottom"):
-                    B[r, c, 2] = 1
-                if border_info.get("left"):
-                    B[r, c, 3] = 1
+        if isinstance(borders, BorderMetadata):
+            # 读取器只覆盖扫描过的区域，按重叠部分整块拷贝
+            h = min(self.n_rows, borders.shape[0])
+            w = min(self.n_cols, borders.shape[1])
+            overlap = {side: getattr(borders, side)[:h, :w] for side in ("top", "right", "bottom", "left")}
+            if not any(matrix.any() for matrix in overlap.values()):
+                return Borders.none(shape)
+            sides = {side: np.zeros(shape, dtype=np.uint8) for side in overlap}
+            for side, matrix in sides.items():
+                matrix[:h, :w] = overlap[side]
+            return Borders(**sides)
+        
+        # {(r, c): {方向: bool}} 形式：收集坐标后按方向一次散射写入
+        entries = list(borders.items())
+        if not entries:
+            return Borders.none(shape)
+        sides = {side: np.zeros(shape, dtype=np.uint8) for side in ("top", "right", "bottom", "left")}
+        coords = np.array([key for key, _ in entries], dtype=np.int64).reshape(-1, 2)
+        rs, cs = coords[:, 0], coords[:, 1]
+        in_bounds = (rs >= 0) & (rs < self.n_rows) & (cs >= 0) & (cs < self.n_cols)
+        for side, matrix in sides.items():
+            flags = np.fromiter((bool(info.get(side)) for _, info in entries), dtype=bool, count=len(entries))
+            selected = in_bounds & flags
+            matrix[rs[selected], cs[selected]] = 1
         
-        return B
+        return Borders(**sides)
     
     def build_style_matrix(self) -> np.ndarray:
         """
@@ -72,28 +168,42 @@ class GridBuilder:
         S = np.zeros((self.n_rows, self.n_cols), dtype=np.float32)
         styles = self.metadata.get("styles", {})
         
-        for (r, c), style_info in styles.items():
-            if 0 <= r < self.n_rows and 0 <= c < self.n_cols:
-                score = 0.0
-                if style_info.get("bold"):
-                    score += 0.5
-                if style_info.get("bg_color"):
-                    score += 0.3
-                S[r, c] = score
+        if isinstance(styles, StyleMetadata):
+            h = min(self.n_rows, styles.shape[0])
+            w = min(self.n_cols, styles.shape[1])
+            # 加粗 +0.5，有背景色 +0.3（bg_color 按真值判断，None/空串不计）
+            S[:h, :w] = (np.where(styles.bold[:h, :w], 0.5, 0.0)
+                         + np.where(styles.bg_color[:h, :w].astype(bool), 0.3, 0.0))
+        else:
+            for (r, c), style_info in styles.items():
+                if 0 <= r < self.n_rows and 0 <= c < self.n_cols:
+                    score = 0.0
+                    if style_info.get("bold"):
+                        score += 0.5
+                    if style_info.get("bg_color"):
+                        score += 0.3
+                    S[r, c] = score
         
         # 对于 xlsb/csv，样式信息较少，可以基于文本特征推断
         if self.format in (FileFormat.xlsb, FileFormat.csv):
             # 基于文本比例：如果某行文本比例高，可能是表头
-            for r in range(min(10, self.n_rows)):  # 只检查前10行
-                text_ratio = 0.0
-                for c in range(self.n_cols):
-                    val = self.df.iloc[r, c]
-                    if pd.notna(val):
-                        sval = str(val).strip()
-                        # 检查是否为文本（非数字、非日期）
-                        if sval and not self._is_numeric(sval):
-                            text_ratio += 1.0
-                text_ratio /= max(self.n_cols, 1)
+            n_check = min(10, self.n_rows)  # 只检查前10行
+            text_mask = self._get_nonblank_mask()[:n_check].copy()
+            stripped = self._get_stripped()
+            is_text = np.frompyfunc(lambda s: not self._is_numeric(s), 1, 1)
+            for c, dtype in enumerate(self.df.dtypes):
+                if dtype.kind in "iuf":
+                    # 数值列的非空值都能解析为数字
+                    text_mask[:, c] = False
+                    continue
+                if dtype.kind in "bcmM":
+                    # 布尔/复数/日期的字符串形式都不是数字，非空即文本
+                    continue
+                rows = np.flatnonzero(text_mask[:, c])
+                if rows.size:
+                    text_mask[rows, c] = is_text(stripped[rows, c]).astype(bool)
+            text_ratios = np.count_nonzero(text_mask, axis=1) / max(self.n_cols, 1)
+            for r, text_ratio in enumerate(text_ratios.tolist()):
                 S[r, :] += text_ratio * 0.2  # 降权
         
         return S
@@ -103,19 +213,22 @@ class GridBuilder:
         构建类型矩阵 T[r, c]: 记录单元格类型（文本/数字/日期等）
         返回: 0=空, 1=文本, 2=数字, 3=日期
         """
-        T = np.zeros((self.n_rows, self.n_cols), dtype=np.int8)
+        T = np.zeros((self.n_rows, self.n_cols), dtype=np.uint8)
+        nonblank = self._get_nonblank_mask()
+        classify = np.frompyfunc(self._cell_type, 1, 1)
         
-        for r in range(self.n_rows):
-            for c in range(self.n_cols):
-                val = self.df.iloc[r, c]
-                if pd.isna(val) or str(val).strip() == "":
-                    T[r, c] = 0
-                elif self._is_numeric(str(val)):
-                    T[r, c] = 2
-                elif self._is_date_like(str(val)):
-                    T[r, c] = 3
-                else:
-                    T[r, c] = 1
+        # 按列 dtype 分派：数值列的非空值 str() 后必能 float()，日期/时长列的 str() 必含 "-" 或 ":"
+        for c, dtype in enumerate(self.df.dtypes):
+            rows = np.flatnonzero(nonblank[:, c])
+            if not rows.size:
+                continue
+            if dtype.kind in "iuf":
+                T[rows, c] = 2
+            elif dtype.kind in "mM":
+                T[rows, c] = 3
+            else:
+                values = self.df.iloc[:, c].to_numpy(dtype=object)[rows]
+                T[rows, c] = classify(values).astype(np.uint8)
         
         return T
     
@@ -123,16 +236,31 @@ class GridBuilder:
         """获取合并单元格信息"""
         return self.metadata.get("merged_cells", [])
     
+    def _cell_type(self, val: Any) -> int:
+        """非空单元的类型：1=文本, 2=数字, 3=日期"""
+        if isinstance(val, (int, float)) and not isinstance(val, bool):
+            return 2
+        s = str(val)
+        if self._is_numeric(s):
+            return 2
+        if self._is_date_like(s):
+            return 3
+        return 1
+    
     def _is_numeric(self, s: str) -> bool:
         """判断字符串是否为数字"""
+        s = s.translate(_NUM_STRIP)
+        if _NUM_RE.fullmatch(s):
+            return True
+        if not _MAYBE_FLOAT_RE.search(s):
+            return False
         try:
-            float(s.replace(",", "").replace("%", "").replace("¥", "").replace("$", ""))
+            float(s)
             return True
-        except:
+        except (ValueError, TypeError):
             return False
     
     def _is_date_like(self, s: str) -> bool:
         """判断字符串是否像日期"""
-        date_indicators = ["-", "/", "年", "月", "日", ":", "T"]
-        return any(indicator in s for indicator in date_indicators) and len(s) >= 6
+        return len(s) >= 6 and _DATE_RE.search(s) is not None
 
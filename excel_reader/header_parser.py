@@ -3,13 +3,91 @@
 """
 import pandas as pd
 import numpy as np
-from collections import Counter
+from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 from .models import HeaderHierarchy
 from .config import ParserConfig
 from .models import FileFormat
 
 
+def _count_header_types(O: np.ndarray, T: np.ndarray, r0: int, r1: int,
+                        c0: int, c1: int) -> Tuple[np.ndarray, np.ndarray]:
+    """O/T 子区域 [r0,r1)×[c0,c1) 内逐行统计 (文本数, 数字数)"""
+    n_rows, n_cols = max(r1 - r0, 0), max(c1 - c0, 0)
+    types = np.zeros((n_rows, n_cols), dtype=T.dtype)
+    tr1, tc1 = min(r1, T.shape[0]), min(c1, T.shape[1])
+    if tr1 > r0 and tc1 > c0:
+        types[:tr1 - r0, :tc1 - c0] = T[r0:tr1, c0:tc1]
+    types[O[r0:r0 + n_rows, c0:c0 + n_cols] != 1] = 0
+    return np.count_nonzero(types == 1, axis=1), np.count_nonzero(types == 2, axis=1)
+
+
+def _merge_owners(header_rows: List[int], c0: int, c1: int, merged_cells: List[Dict]
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    表头行 × 列 [c0,c1) → 所在合并单元格的左上角 (行, 列)，-1 表示不在合并单元格内
+    合并区重叠时分别给出 merged_cells 中先出现者与后出现者：(first_r, first_c, last_r, last_c)
+    """
+    width = max(c1 - c0, 0)
+    first_r, first_c, last_r, last_c = (np.full((len(header_rows), width), -1, dtype=np.int64)
+                                        for _ in range(4))
+    for merged in merged_cells:
+        mr0, mr1 = merged["min_row"], merged["max_row"]
+        mc0, mc1 = merged["min_col"], merged["max_col"]
+        lo = max(mc0, c0) - c0
+        hi = min(mc1 + 1, c1) - c0
+        if lo >= hi:
+            continue
+        for i, row_idx in enumerate(header_rows):
+            if mr0 <= row_idx <= mr1:
+                last_r[i, lo:hi] = mr0
+                last_c[i, lo:hi] = mc0
+                unset = first_r[i, lo:hi] < 0
+                first_r[i, lo:hi][unset] = mr0
+                first_c[i, lo:hi][unset] = mc0
+    return first_r, first_c, last_r, last_c
+
+
+def _title(value) -> Optional[str]:
+    """单元格值 -> 标题：str(value).strip()，空值或空串为 None"""
+    if pd.isna(value):
+        return None
+    return str(value).strip() or None
+
+
+_to_titles = np.frompyfunc(_title, 1, 1)
+
+
+def _resolve_header_titles(values: np.ndarray, header_rows: List[int], c0: int, c1: int,
+                           merged_cells: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    表头行 × 列 [c0,c1) 的标题矩阵（object，无标题处为 None），合并区内取左上角的值
+    values: 整个 sheet 的 object 数组；c1 不超过其列数
+    返回 (map_titles, leaf_titles)：
+      map_titles  供 header_map：重叠时后出现的合并区优先，左上角越界视为无标题
+      leaf_titles 供叶子列名：重叠时先出现的合并区优先，左上角为空或越界时退回单元格自身的值
+    """
+    n_rows, n_cols = values.shape
+    first_r, first_c, last_r, last_c = _merge_owners(header_rows, c0, c1, merged_cells)
+    shape = first_r.shape
+    
+    rows = np.asarray(header_rows, dtype=np.int64)
+    direct = np.full(shape, None, dtype=object)
+    in_rows = rows < n_rows
+    direct[in_rows] = values[rows[in_rows], c0:c0 + shape[1]]
+    
+    def owner_values(owner_r: np.ndarray, owner_c: np.ndarray) -> np.ndarray:
+        found = (owner_r >= 0) & (owner_r < n_rows) & (owner_c < n_cols)
+        out = np.full(shape, None, dtype=object)
+        out[found] = values[owner_r[found], owner_c[found]]
+        return out
+    
+    map_values = np.where(last_r >= 0, owner_values(last_r, last_c), direct)
+    first_values = owner_values(first_r, first_c)
+    leaf_values = np.where(pd.notna(first_values), first_values, direct)
+    return _to_titles(map_values), _to_titles(leaf_values)
+
+
 class HeaderParser:
     """表头解析器"""
     
@@ -18,12 +96,16 @@ class HeaderParser:
         self.format = format
     
     def parse_headers(self, df: pd.DataFrame, block, O: np.ndarray, S: np.ndarray, 
-                     T: np.ndarray, merged_cells: List[Dict]) -> HeaderHierarchy:
+                     T: np.ndarray, merged_cells: List[Dict],
+                     values: Optional[np.ndarray] = None) -> HeaderHierarchy:
         """
         解析表头
+        values: df.to_numpy(dtype=object) 的快照（同一 sheet 的多个块共用，缺省时现算）
         返回 HeaderHierarchy
         """
         hierarchy = HeaderHierarchy()
+        if values is None:
+            values = df.to_numpy(dtype=object)
         
         # 1. 检测表头行
         header_rows = self._detect_header_rows(df, block, O, S, T)
@@ -31,16 +113,21 @@ class HeaderParser:
         
         if not header_rows:
             # 如果没有检测到表头，使用第一行作为列名
-            hierarchy.leaf_columns = [str(df.iloc[block.r0, c]) if block.r0 < df.shape[0] and c < df.shape[1] 
+            n_rows, n_cols = df.shape
+            hierarchy.leaf_columns = [str(values[block.r0, c]) if block.r0 < n_rows and c < n_cols
                                      else f"Column{c}" for c in range(block.c0, block.c1)]
             return hierarchy
         
+        # 合并区重定向后的表头标题（映射与叶子列名共用一次解析）
+        c_end = min(block.c1, values.shape[1])
+        map_titles, leaf_titles = _resolve_header_titles(values, header_rows, block.c0, c_end, merged_cells)
+        
         # 2. 构建层级映射
-        header_map = self._build_header_map(df, block, header_rows, merged_cells)
+        header_map = self._build_header_map(map_titles, block, header_rows)
         hierarchy.header_map = header_map
         
         # 3. 展开到叶子级
-        hierarchy.leaf_columns = self._expand_to_leaf_columns(df, block, header_rows, header_map, merged_cells)
+        hierarchy.leaf_columns = self._expand_to_leaf_columns(leaf_titles, block)
         
         return hierarchy
     
@@ -51,21 +138,28 @@ class HeaderParser:
         基于：文本比例↑、数值比例↓、样式强度↑、合并覆盖↑
         """
         header_rows = []
-        max_rows_to_check = min(block.r0 + self.config.max_header_rows, block.r1, df.shape[0])
-        
-        for r in range(block.r0, max_rows_to_check):
+        n_rows, n_cols = df.shape
+        max_header_rows = self.config.max_header_rows
+        max_rows_to_check = min(block.r0 + max_header_rows, block.r1, n_rows)
+        c_end = min(block.c1, n_cols)
+        
+        # 各候选行的文本/数字单元数（占用且类型为 1/2；超出 T 范围的按类型 0 计）
+        text_counts, numeric_counts = _count_header_types(O, T, block.r0, max_rows_to_check, block.c0, c_end)
+        text_counts = text_counts.tolist()
+        numeric_counts = numeric_counts.tolist()
+        
+        # 循环不变量
+        use_style = self.format == FileFormat.xlsx
+        style_weight = self.config.header_style_weight
+        s_rows = S.shape[0]
+        s_c_end = min(block.c1, S.shape[1])
+        
+        for i, r in enumerate(range(block.r0, max_rows_to_check)):
             score = 0.0
             
             # 文本比例
-            text_count = 0
-            numeric_count = 0
-            for c in range(block.c0, min(block.c1, df.shape[1])):
-                if O[r, c] == 1:
-                    cell_type = T[r, c] if r < T.shape[0] and c < T.shape[1] else 0
-                    if cell_type == 1:  # 文本
-                        text_count += 1
-                    elif cell_type == 2:  # 数字
-                        numeric_count += 1
+            text_count = text_counts[i]
+            numeric_count = numeric_counts[i]
             
             total = text_count + numeric_count
             if total > 0:
@@ -73,9 +167,9 @@ class HeaderParser:
                 score += text_ratio * 0.4
             
             # 样式强度（xlsx 有效）
-            if self.format == FileFormat.xlsx and r < S.shape[0]:
-                style_score = np.mean(S[r, block.c0:min(block.c1, S.shape[1])])
-                score += style_score * self.config.header_style_weight
+            if use_style and r < s_rows:
+                style_score = np.mean(S[r, block.c0:s_c_end])
+                score += style_score * style_weight
             
             # 数值比例低
             if total > 0:
@@ -88,100 +182,38 @@ class HeaderParser:
             if score > 0.4:  # 阈值
                 header_rows.append(r)
         
-        return header_rows[:self.config.max_header_rows]
+        return header_rows[:max_header_rows]
     
-    def _build_header_map(self, df: pd.DataFrame, block, header_rows: List[int], 
-                         merged_cells: List[Dict]) -> Dict[Tuple[int, int], List[str]]:
+    def _build_header_map(self, titles: np.ndarray, block,
+                         header_rows: List[int]) -> Dict[Tuple[int, int], List[str]]:
         """
         构建表头映射: (row_idx, col_idx) → 层级标题列表
+        titles: 表头行 × 块内列的标题矩阵（见 _resolve_header_titles），None 表示无标题
         """
-        header_map = {}
-        
-        # 构建合并单元格索引（快速查找）
-        merged_index = {}
-        for merged in merged_cells:
-            mr0, mr1 = merged["min_row"], merged["max_row"]
-            mc0, mc1 = merged["min_col"], merged["max_col"]
-            for r in range(mr0, mr1 + 1):
-                for c in range(mc0, mc1 + 1):
-                    merged_index[(r, c)] = (mr0, mc0)  # 指向合并单元格的左上角
-        
-        # 对每个表头行，收集标题
-        for row_idx in header_rows:
-            for col_idx in range(block.c0, min(block.c1, df.shape[1])):
-                # 检查是否在合并单元格内
-                if (row_idx, col_idx) in merged_index:
-                    # 使用合并单元格的左上角值
-                    merge_r, merge_c = merged_index[(row_idx, col_idx)]
-                    if merge_r < df.shape[0] and merge_c < df.shape[1]:
-                        value = df.iloc[merge_r, merge_c]
-                    else:
-                        value = None
-                else:
-                    value = df.iloc[row_idx, col_idx] if row_idx < df.shape[0] and col_idx < df.shape[1] else None
-                
-                if pd.notna(value) and str(value).strip() != "":
-                    key = (row_idx, col_idx)
-                    if key not in header_map:
-                        header_map[key] = []
-                    header_map[key].append(str(value).strip())
-        
+        rows, cols = np.nonzero(titles != None)  # 逐元素比较，不能写成 is not None
+        header_map = {(header_rows[i], block.c0 + j): [titles[i, j]]
+                      for i, j in zip(rows.tolist(), cols.tolist())}
         return header_map
     
-    def _expand_to_leaf_columns(self, df: pd.DataFrame, block, header_rows: List[int],
-                                header_map: Dict[Tuple[int, int], List[str]],
-                                merged_cells: List[Dict]) -> List[str]:
+    def _expand_to_leaf_columns(self, titles: np.ndarray, block) -> List[str]:
         """
         展开到叶子级列名
+        titles: 表头行 × 块内列的标题矩阵（见 _resolve_header_titles），None 表示无标题
         """
         leaf_columns = []
+        keep_leaf_only = self.config.keep_leaf_only
         
-        # 构建合并单元格范围
-        merged_ranges = {}
-        for merged in merged_cells:
-            mr0, mr1 = merged["min_row"], merged["max_row"]
-            mc0, mc1 = merged["min_col"], merged["max_col"]
-            for c in range(mc0, mc1 + 1):
-                if c not in merged_ranges:
-                    merged_ranges[c] = []
-                merged_ranges[c].append((mr0, mr1, mc0, mc1))
-        
-        # 对每一列，收集所有层级的标题
-        for c in range(block.c0, min(block.c1, df.shape[1])):
+        # 对每一列，自上而下收集各层级的标题（去重保序）
+        for j, column_titles in enumerate(titles.T.tolist()):
+            c = block.c0 + j
             column_path = []
-            
-            # 从最上层表头行开始，向下收集
-            for row_idx in header_rows:
-                # 检查该列是否在合并单元格内
-                in_merged = False
-                merged_value = None
-                
-                for merged in merged_cells:
-                    mr0, mr1 = merged["min_row"], merged["max_row"]
-                    mc0, mc1 = merged["min_col"], merged["max_col"]
-                    if mr0 <= row_idx <= mr1 and mc0 <= c <= mc1:
-                        # 使用合并单元格左上角的值
-                        if mr0 < df.shape[0] and mc0 < df.shape[1]:
-                            merged_value = df.iloc[mr0, mc0]
-                        in_merged = True
-                        break
-                
-                if in_merged and pd.notna(merged_value):
-                    value = str(merged_value).strip()
-                    if value and value not in column_path:
-                        column_path.append(value)
-                else:
-                    # 直接读取单元格
-                    if row_idx < df.shape[0] and c < df.shape[1]:
-                        value = df.iloc[row_idx, c]
-                        if pd.notna(value) and str(value).strip() != "":
-                            value_str = str(value).strip()
-                            if value_str not in column_path:
-                                column_path.append(value_str)
+            for value in column_titles:
+                if value is not None and value not in column_path:
+                    column_path.append(value)
             
             # 合并路径为列名
             if column_path:
-                if self.config.keep_leaf_only:
+                if keep_leaf_only:
                     # 只保留最底层（最后一个）
                     leaf_name = column_path[-1]
                 else:
@@ -199,18 +231,18 @@ class HeaderParser:
     
     def _handle_duplicate_columns(self, columns: List[str]) -> List[str]:
         """处理重复列名"""
-        counts = Counter(columns)
-        result = []
-        seen = {}
+        counts = defaultdict(int)
+        for col in columns:
+            counts[col] += 1
         
+        suffix = self.config.duplicate_col_suffix
+        seen = defaultdict(int)
+        result = []
         for col in columns:
             if counts[col] > 1:
-                if col not in seen:
-                    seen[col] = 0
                 seen[col] += 1
-                result.append(f"{col}{self.config.duplicate_col_suffix.format(n=seen[col])}")
+                result.append(f"{col}{suffix.format(n=seen[col])}")
             else:
                 result.append(col)
-        
         return result
 
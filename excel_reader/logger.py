@@ -3,10 +3,79 @@
 """
 import json
 import logging
+import logging.handlers
+import time
 from pathlib import Path
-from datetime import datetime, timezone
 from typing import Optional, Dict, Any
-from .models import LogEvent, LogLevel, FileFormat, ErrorCode, WarningCode
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .models import LogLevel, FileFormat, ErrorCode, WarningCode
+
+# 日志文件缓冲：JSONL 写缓冲区大小、文本日志在内存中累积的记录数
+_JSONL_BUFFER_SIZE = 1 << 16
+_TXT_BUFFER_RECORDS = 1024
+# 写完后立即落盘的 JSONL 事件（其余事件随缓冲区或 close 写出；ERROR 级别总是立即写出）
+_FLUSH_EVENTS = frozenset({"run.start", "run.end"})
+
+def _dumps(obj: Dict[str, Any]) -> bytes:
+    """
+    JSONL 一行（UTF-8 字节，不含换行）；有 orjson 时优先使用，遇到它不支持的类型时退回 json
+    json 使用与 orjson 相同的紧凑分隔符，两条路径写出的行一致
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# 日志级别的严重程度（低于 DualLogger.log_level 的事件不记录）
+_LEVEL_SEVERITY = {LogLevel.DEBUG: 10, LogLevel.INFO: 20, LogLevel.WARN: 30, LogLevel.ERROR: 40}
+
+
+def level_enabled(level: LogLevel, threshold: LogLevel) -> bool:
+    """level 级别的事件在阈值 threshold 下是否记录"""
+    return _LEVEL_SEVERITY[level] >= _LEVEL_SEVERITY[threshold]
+
+
+# 事件时间戳格式（UTC，固定保留 6 位微秒；isoformat 在微秒为 0 时会省略，两者不完全一致）
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S"
+_ts_cache = [-1, ""]  # [整秒, 该秒格式化后的前缀]
+
+
+def _fast_iso(t: float) -> str:
+    """epoch 秒 -> "YYYY-MM-DDTHH:MM:SS.ffffffZ"；同一秒内复用 strftime 结果"""
+    sec = int(t)
+    if sec != _ts_cache[0]:
+        _ts_cache[0] = sec
+        _ts_cache[1] = time.strftime(_TS_FORMAT, time.gmtime(sec))
+    return "%s.%06dZ" % (_ts_cache[1], int((t - sec) * 1e6))
+
+
+# 无需转换即可直接 JSON 序列化的标量类型（float 另需排除 NaN，转换器会把 NaN 变成 None）
+_NATIVE_SCALARS = frozenset({int, str, bool, type(None)})
+
+
+def _is_native_metrics(metrics) -> bool:
+    """metrics 是否为只含原生标量的普通 dict"""
+    if metrics.__class__ is not dict:
+        return False
+    for v in metrics.values():
+        t = type(v)
+        if t in _NATIVE_SCALARS:
+            continue
+        if t is float and v == v:
+            continue
+        return False
+    return True
 
 
 class DualLogger:
@@ -25,11 +94,19 @@ class DualLogger:
             "[%(asctime)s %(levelname)s] %(message)s",
             datefmt="%Y-%m-%dT%H:%M:%SZ"
         ))
-        self.txt_logger.addHandler(txt_handler)
+        # 记录先在内存中累积，满 _TXT_BUFFER_RECORDS 条、遇到 ERROR 或 close 时批量写出
+        self.txt_handler = logging.handlers.MemoryHandler(
+            _TXT_BUFFER_RECORDS, flushLevel=logging.ERROR, target=txt_handler
+        )
+        self.txt_logger.addHandler(self.txt_handler)
         
-        # JSONL 日志
+        # JSONL 日志（二进制、带缓冲写出，不再逐条 flush）
         self.jsonl_path = log_dir / "run.log.jsonl"
-        self.jsonl_file = open(self.jsonl_path, "w", encoding="utf-8")
+        self.jsonl_file = open(self.jsonl_path, "wb", buffering=_JSONL_BUFFER_SIZE)
+    
+    def is_enabled(self, level: LogLevel) -> bool:
+        """level 级别的事件是否会被记录（调用方据此跳过 metrics 等参数的构造）"""
+        return level_enabled(level, self.log_level)
     
     def log(self, event: str, level: LogLevel = LogLevel.INFO, file: Optional[str] = None,
             format: Optional[FileFormat] = None, sheet: Optional[str] = None,
@@ -38,69 +115,60 @@ class DualLogger:
             error_code: Optional[ErrorCode] = None,
             warning_code: Optional[WarningCode] = None):
         """
-        记录日志事件
+        记录日志事件（低于 log_level 的事件直接丢弃）
         """
+        if not level_enabled(level, self.log_level):
+            return
+        
         # 生成 UTC 时间戳
-        ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        ts = _fast_iso(time.time())
         
-        # 构建日志事件
-        log_event = LogEvent(
-            ts=ts,
-            lvl=level,
-            event=event,
-            file=file,
-            format=format,
-            sheet=sheet,
-            block_id=block_id,
-            message=message,
-            metrics=metrics,
-            error_code=error_code,
-            warning_code=warning_code
-        )
+        # 直接由参数序列化（不经 LogEvent 中转）
+        if metrics and not _is_native_metrics(metrics):
+            # 转换 numpy/pandas 类型为 Python 原生类型
+            metrics = self._convert_to_json_serializable(metrics)
         
         # 写入 JSONL
         json_obj = {
-            "ts": log_event.ts,
-            "lvl": log_event.lvl.value,
-            "event": log_event.event,
+            "ts": ts,
+            "lvl": level.value,
+            "event": event,
         }
-        if log_event.file:
-            json_obj["file"] = log_event.file
-        if log_event.format:
-            json_obj["format"] = log_event.format.value
-        if log_event.sheet:
-            json_obj["sheet"] = log_event.sheet
-        if log_event.block_id:
-            json_obj["block_id"] = log_event.block_id
-        if log_event.message:
-            json_obj["message"] = log_event.message
-        if log_event.metrics:
-            # 转换 numpy/pandas 类型为 Python 原生类型
-            json_obj["metrics"] = self._convert_to_json_serializable(log_event.metrics)
-        if log_event.error_code:
-            json_obj["error_code"] = log_event.error_code.value
-        if log_event.warning_code:
-            json_obj["warning_code"] = log_event.warning_code.value
+        if file:
+            json_obj["file"] = file
+        if format:
+            json_obj["format"] = format.value
+        if sheet:
+            json_obj["sheet"] = sheet
+        if block_id:
+            json_obj["block_id"] = block_id
+        if message:
+            json_obj["message"] = message
+        if metrics:
+            json_obj["metrics"] = metrics
+        if error_code:
+            json_obj["error_code"] = error_code.value
+        if warning_code:
+            json_obj["warning_code"] = warning_code.value
         
-        self.jsonl_file.write(json.dumps(json_obj, ensure_ascii=False) + "\n")
-        self.jsonl_file.flush()
+        self.jsonl_file.write(_dumps(json_obj) + b"\n")
+        if level == LogLevel.ERROR or event in _FLUSH_EVENTS:
+            self.jsonl_file.flush()
         
         # 写入文本日志
-        parts = [f"{log_event.event}"]
-        if log_event.file:
-            parts.append(f"file={log_event.file}")
-        if log_event.format:
-            parts.append(f"format={log_event.format.value}")
-        if log_event.sheet:
-            parts.append(f"sheet={log_event.sheet}")
-        if log_event.block_id:
-            parts.append(f"block_id={log_event.block_id}")
-        if log_event.message:
-            parts.append(log_event.message)
-        if log_event.metrics:
-            # 转换 metrics 中的值以便正确格式化
-            metrics_converted = self._convert_to_json_serializable(log_event.metrics)
-            metrics_str = " ".join(f"{k}={v}" for k, v in metrics_converted.items())
+        parts = [event]
+        if file:
+            parts.append(f"file={file}")
+        if format:
+            parts.append(f"format={format.value}")
+        if sheet:
+            parts.append(f"sheet={sheet}")
+        if block_id:
+            parts.append(f"block_id={block_id}")
+        if message:
+            parts.append(message)
+        if metrics:
+            metrics_str = " ".join(f"{k}={v}" for k, v in metrics.items())
             if metrics_str:
                 parts.append(metrics_str)
         
@@ -117,10 +185,9 @@ class DualLogger:
         """
         将 numpy/pandas 类型转换为 JSON 可序列化的 Python 原生类型
         """
-        import numpy as np
-        import pandas as pd
-        
-        if isinstance(obj, dict):
+        if isinstance(obj, float):
+            return None if obj != obj else obj
+        elif isinstance(obj, dict):
             return {k: self._convert_to_json_serializable(v) for k, v in obj.items()}
         elif isinstance(obj, (list, tuple)):
             return [self._convert_to_json_serializable(item) for item in obj]
@@ -132,7 +199,7 @@ class DualLogger:
             return bool(obj)
         elif isinstance(obj, np.ndarray):
             return obj.tolist()
-        elif pd.isna(obj):
+        elif obj is None or obj is pd.NA or obj is pd.NaT:
             return None
         else:
             # 尝试直接转换（适用于 numpy 标量类型）
@@ -144,7 +211,13 @@ class DualLogger:
             return obj
     
     def close(self):
-        """关闭日志文件"""
+        """关闭日志文件（写出缓冲中的记录，并从共享的 logger 上移除本次的文本 handler）"""
         if self.jsonl_file:
             self.jsonl_file.close()
+        if self.txt_handler:
+            target = self.txt_handler.target
+            self.txt_logger.removeHandler(self.txt_handler)
+            self.txt_handler.close()  # 写出缓冲并解除 target
+            target.close()
+            self.txt_handler = None
 
@@ -5,6 +5,7 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Tuple, Literal, Any
 from enum import Enum
+import numpy as np
 
 # ========== 枚举 ==========
 class FileFormat(str, Enum):
@@ -74,6 +75,75 @@ class TableMeta:
     warnings: List[str] = field(default_factory=list)     # WarningCode/自由文案
 
 
+# ========== 读取器元数据 ==========
+@dataclass
+class BorderMetadata:
+    """
+    读取器输出的边框信息（SoA）：四个方向各一张 (行, 列) 的 bool 矩阵，True 表示该侧有边框。
+    只覆盖扫描过的区域，形状可能小于 DataFrame。
+    """
+    left: np.ndarray
+    right: np.ndarray
+    top: np.ndarray
+    bottom: np.ndarray
+
+    @classmethod
+    def empty(cls) -> BorderMetadata:
+        return cls(*(np.zeros((0, 0), dtype=bool) for _ in range(4)))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.left.shape
+
+    def any_side(self) -> np.ndarray:
+        return self.left | self.right | self.top | self.bottom
+
+    def __len__(self) -> int:
+        """有边框的单元数"""
+        return int(np.count_nonzero(self.any_side()))
+
+    def items(self):
+        """兼容旧格式：逐个产出 ((行, 列), {方向: True})"""
+        sides = (("left", self.left), ("right", self.right), ("top", self.top), ("bottom", self.bottom))
+        for r, c in zip(*np.nonzero(self.any_side())):
+            yield (int(r), int(c)), {side: True for side, matrix in sides if matrix[r, c]}
+
+
+@dataclass
+class StyleMetadata:
+    """
+    读取器输出的样式信息（SoA）：bold 为 bool 矩阵，bg_color 为 object 矩阵（无填充色处为 None）。
+    只覆盖扫描过的区域，形状可能小于 DataFrame。
+    """
+    bold: np.ndarray
+    bg_color: np.ndarray
+
+    @classmethod
+    def empty(cls) -> StyleMetadata:
+        return cls(np.zeros((0, 0), dtype=bool), np.empty((0, 0), dtype=object))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.bold.shape
+
+    def _present(self) -> np.ndarray:
+        return self.bold | (self.bg_color != None)  # 逐元素比较，不能写成 is not None
+
+    def __len__(self) -> int:
+        """有样式的单元数"""
+        return int(np.count_nonzero(self._present()))
+
+    def items(self):
+        """兼容旧格式：逐个产出 ((行, 列), {"bold": True, "bg_color": ...})（只含已设置的键）"""
+        for r, c in zip(*np.nonzero(self._present())):
+            info = {}
+            if self.bold[r, c]:
+                info["bold"] = True
+            if self.bg_color[r, c] is not None:
+                info["bg_color"] = self.bg_color[r, c]
+            yield (int(r), int(c)), info
+
+
 # ========== Manifest（运行清单）==========
 @dataclass
 class OutputItem:
@@ -1,7 +1,11 @@
 """
 主解析器 - 统一入口函数
 """
+import gc
+import os
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
@@ -10,7 +14,7 @@ from .grid_builder import GridBuilder
 from .block_splitter import BlockSplitter, Block
 from .header_parser import HeaderParser
 from .cleaner import Cleaner
-from .logger import DualLogger
+from .logger import DualLogger, level_enabled
 from .exporter import Exporter
 from .preprocessor import FilePreprocessor
 from .models import FileFormat, TableMeta, TableScore, HeaderHierarchy, Manifest, OutputItem, WarningCode, LogLevel
@@ -19,6 +23,18 @@ from .constants import RUN_ID_FORMAT, RUN_TS_FORMAT, DIR_LOGS
 from .exceptions import InvalidArgumentError, OutputWriteError
 
 
+# 块数少于此值时逐块串行处理（线程池的调度开销大于收益）
+_MIN_BLOCKS_FOR_THREADS = 4
+
+# Manifest 时间戳格式（UTC，固定保留微秒，与日志事件时间戳一致）
+_ISO_Z_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def _utc_iso_z(dt: datetime) -> str:
+    """UTC datetime -> "YYYY-MM-DDTHH:MM:SS.ffffffZ"（单次 strftime，不经 isoformat + replace）"""
+    return dt.strftime(_ISO_Z_FORMAT)
+
+
 def parse_file(
     file_path: str,
     sheet_name: Optional[List[str]] = None,
@@ -64,17 +80,16 @@ def parse_file(
     logger = DualLogger(log_dir, config.log_level)
     
     try:
-        logger.log("run.start", file=Path(file_path).name, format=file_format)
+        src_name = Path(file_path).name
+        logger.log("run.start", file=src_name, format=file_format)
+        exporter = Exporter(run_dir, config)  # 整个 run 共用（CSV、元数据、Manifest）
         
         # 4. 预处理文件（检查大小、行数、列数等）
         preprocessor = FilePreprocessor(config, logger)
         preprocess_info = preprocessor.preprocess_file(file_path, file_format)
         
-        # 根据预处理结果优化配置
-        max_rows, max_cols = preprocessor.get_optimized_limits(
-            preprocess_info["estimated_rows"], 
-            preprocess_info["estimated_cols"]
-        )
+        # 读取上限取配置值：估算行列数只来自第一个 sheet，只用于超限警告，不能用来截断其他 sheet
+        max_rows, max_cols = config.max_rows, config.max_cols
         
         # 如果文件很大，自动优化样式和边框扫描
         if preprocess_info["should_optimize"]:
@@ -96,187 +111,90 @@ def parse_file(
         else:
             sheets_to_process = sheet_name
         
-        logger.log("file.loaded", file=Path(file_path).name, format=file_format,
-                  metrics={"sheets": sheets_to_process, "sequential": config.process_sheets_sequentially})
+        if logger.is_enabled(LogLevel.INFO):
+            logger.log("file.loaded", file=src_name, format=file_format,
+                      metrics={"sheets": sheets_to_process, "sequential": config.process_sheets_sequentially})
         
         # 6. 处理每个 sheet（逐个处理以减少内存占用）
         all_dfs = {}
         all_metas = {}
         df_counter = 1
+        read_options = dict(
+            max_rows=max_rows, max_cols=max_cols,
+            enable_style_scan=config.enable_style_scan,
+            enable_border_scan=config.enable_border_scan,
+            style_scan_limit=style_scan_limit,
+            border_scan_limit=border_scan_limit,
+            engine=config.engine,
+            trim_empty=config.trim_empty
+        )
         
-        for sheet_name_key in sheets_to_process:
-            # 逐个读取和处理 sheet
-            if config.process_sheets_sequentially:
-                # 逐个处理模式：读取一个，处理一个，释放内存
-                logger.log("sheet.load.start", sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                          message=f"Loading sheet: {sheet_name_key}")
-                
-                df_raw, metadata = read_single_sheet(
-                    file_path, sheet_name_key, file_format, config.include_hidden,
-                    max_rows=max_rows, max_cols=max_cols,
-                    enable_style_scan=config.enable_style_scan,
-                    enable_border_scan=config.enable_border_scan,
-                    style_scan_limit=style_scan_limit,
-                    border_scan_limit=border_scan_limit
-                )
-                
-                logger.log("sheet.load.complete", sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                          metrics={"rows": len(df_raw), "cols": len(df_raw.columns)})
-            else:
-                # 批量处理模式：一次性读取所有 sheet（向后兼容）
-                if df_counter == 1:  # 只在第一次读取所有 sheet
-                    sheet_data = read_file(
-                        file_path, sheet_name, file_format, config.include_hidden,
-                        max_rows=max_rows, max_cols=max_cols,
-                        enable_style_scan=config.enable_style_scan,
-                        enable_border_scan=config.enable_border_scan,
-                        style_scan_limit=style_scan_limit,
-                        border_scan_limit=border_scan_limit
-                    )
-                df_raw, metadata = sheet_data[sheet_name_key]
-            
-            # 处理当前 sheet
+        if config.workers > 1 and len(sheets_to_process) > 1:
+            # 并行模式：每个 sheet 在独立进程中读取和处理，日志回放到主进程
+            sheet_results = _parse_sheets_parallel(
+                file_path, sheets_to_process, file_format, config, read_options
+            )
+        else:
+            sheet_results = None
+        
+        sheet_data = None
+        for idx, sheet_name_key in enumerate(sheets_to_process):
+            sheet_label = sheet_name_key if sheet_name_key != "__csv__" else None
             try:
-                logger.log("grid.build", sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                          metrics={"cells_total": df_raw.size, "nonempty": df_raw.notna().sum().sum()})
-                
-                # 构建网格
-                grid_builder = GridBuilder(df_raw, metadata, file_format)
-                O = grid_builder.build_occupancy_matrix()
-                B = grid_builder.build_border_matrix() if file_format == FileFormat.xlsx else None
-                S = grid_builder.build_style_matrix()
-                T = grid_builder.build_type_matrix()
-                merged_cells = grid_builder.get_merged_cells()
-                
-                # 分割表块
-                splitter = BlockSplitter(config, file_format)
-                blocks = splitter.split_blocks(O, B)
-                logger.log("split.blocks", sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                          metrics={"count": len(blocks), 
-                                  "sizes": [[b.height, b.width] for b in blocks]})
-                
-                if not blocks:
-                    continue
-                
-                # 处理每个块
-                cleaner = Cleaner(config)
-                header_parser = HeaderParser(config, file_format)
-                scores = {}
-                header_hierarchies = {}
-                
-                # 先解析所有块的表头
-                for block in blocks:
-                    header_hierarchy = header_parser.parse_headers(
-                        df_raw, block, O, S, T, merged_cells
-                    )
-                    header_hierarchies[block.block_id] = header_hierarchy
-                
-                # 计算每个块的评分（使用表头信息）
-                for block in blocks:
-                    header_hierarchy = header_hierarchies[block.block_id]
-                    score = cleaner.calculate_table_score(
-                        block, O, T, B, header_hierarchy.header_rows
+                if sheet_results is not None:
+                    tables, records = sheet_results[idx]
+                    for event, kwargs in records:
+                        logger.log(event, **kwargs)
+                else:
+                    preloaded = None
+                    if not config.process_sheets_sequentially:
+                        # 批量处理模式：一次性读取所有 sheet（向后兼容）
+                        if sheet_data is None:
+                            sheet_data = read_file(
+                                file_path, sheet_name, file_format, config.include_hidden,
+                                workers=config.workers, **read_options
+                            )
+                        preloaded = sheet_data[sheet_name_key]
+                    tables = _parse_single_sheet(
+                        file_path, sheet_name_key, file_format, config, read_options, logger, preloaded
                     )
-                    scores[block.block_id] = score
-                
-                # 识别主表
-                main_block_id = cleaner.identify_main_table(blocks, scores)
-                
-                # 处理每个块
-                for block in blocks:
-                    # 提取块数据
-                    df_block = df_raw.iloc[block.r0:block.r1, block.c0:block.c1].copy()
                 
-                # 获取已解析的表头
-                header_hierarchy = header_hierarchies[block.block_id]
-                logger.log("header.detect", 
-                          sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                          block_id=block.block_id,
-                          metrics={"header_rows": header_hierarchy.header_rows,
-                                  "leaf_cols": len(header_hierarchy.leaf_columns)})
-                
-                # 设置列名
-                if header_hierarchy.leaf_columns:
-                    df_block.columns = header_hierarchy.leaf_columns[:len(df_block.columns)]
-                    # 移除表头行
-                    if header_hierarchy.header_rows:
-                        header_row_indices = [r - block.r0 for r in header_hierarchy.header_rows 
-                                            if block.r0 <= r < block.r1]
-                        if header_row_indices:
-                            df_block = df_block.drop(df_block.index[header_row_indices])
-                            df_block.reset_index(drop=True, inplace=True)
-                
-                # 清洗数据
-                df_cleaned, unit_str, removed_rows = cleaner.clean_dataframe(
-                    df_block, header_hierarchy.header_rows, config.unit_line_patterns
-                )
-                if removed_rows:
-                    logger.log("clean.mid_headers_removed",
-                              warning_code=WarningCode.MID_HEADERS_REMOVED,
-                              metrics={"rows": removed_rows})
-                
-                # 构建 TableMeta
-                meta = TableMeta(
-                    source_file=file_path,
-                    format=file_format,
-                    sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
-                    bbox=(block.r0, block.r1, block.c0, block.c1),
-                    is_main=(block.block_id == main_block_id),
-                    score=scores.get(block.block_id, TableScore()),
-                    header=header_hierarchy,
-                    units=unit_str,
-                )
+                for df_cleaned, meta in tables:
+                    # 导出 CSV
+                    if export_csv:
+                        table_name = sheet_label or "table"
+                        csv_path = exporter.export_csv(df_cleaned, table_name, run_timestamp)
+                        meta.csv_path = str(csv_path)
+                        if logger.is_enabled(LogLevel.INFO):
+                            logger.log("export.csv", 
+                                      message=f"df{df_counter} exported",
+                                      file=str(csv_path),
+                                      metrics={"rows": len(df_cleaned), "cols": len(df_cleaned.columns)})
+                    
+                    # 存储
+                    df_key = f"df{df_counter}"
+                    all_dfs[df_key] = df_cleaned
+                    all_metas[df_key] = meta
+                    df_counter += 1
                 
-                # 导出 CSV
-                csv_path = None
-                if export_csv:
-                    exporter = Exporter(run_dir, config)
-                    table_name = sheet_name_key if sheet_name_key != "__csv__" else "table"
-                    csv_path = exporter.export_csv(df_cleaned, table_name, run_timestamp)
-                    meta.csv_path = str(csv_path)
-                    logger.log("export.csv", 
-                              message=f"df{df_counter} exported",
-                              file=str(csv_path),
-                              metrics={"rows": len(df_cleaned), "cols": len(df_cleaned.columns)})
-                
-                # 存储
-                df_key = f"df{df_counter}"
-                all_dfs[df_key] = df_cleaned
-                all_metas[df_key] = meta
-                df_counter += 1
-                
-                # 逐个处理模式：释放当前 sheet 的原始数据内存
-                if config.process_sheets_sequentially:
-                    del df_block
-                    import gc
-                    gc.collect()  # 强制垃圾回收
-                
-                # 处理完所有块后，释放 sheet 原始数据
-                if config.process_sheets_sequentially and block == blocks[-1]:
-                    del df_raw, O, S, T, B
-                    import gc
+                # 逐个处理模式：释放当前 sheet 的内存
+                if config.process_sheets_sequentially and tables:
+                    del tables
                     gc.collect()
-                    logger.log("sheet.process.complete", sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
+                    logger.log("sheet.process.complete", sheet=sheet_label,
                               message=f"Sheet processed and memory released")
             
             except Exception as e:
                 logger.log("sheet.process.error", level=LogLevel.ERROR,
-                          sheet=sheet_name_key if sheet_name_key != "__csv__" else None,
+                          sheet=sheet_label,
                           message=f"Error processing sheet: {str(e)}")
                 # 即使出错也释放内存
                 if config.process_sheets_sequentially:
-                    try:
-                        if 'df_raw' in locals():
-                            del df_raw
-                        import gc
-                        gc.collect()
-                    except:
-                        pass
+                    gc.collect()
                 raise
         
         # 6. 导出元数据
         if all_metas:
-            exporter = Exporter(run_dir, config)
             exporter.export_metadata(all_metas)
         
         # 7. 生成 Manifest
@@ -286,21 +204,20 @@ def parse_file(
             format=file_format,
             sheets=sheet_name if file_format != FileFormat.csv else None,
             config_profile="default",
-            started_at_utc=run_timestamp.isoformat().replace("+00:00", "Z"),
-            finished_at_utc=datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            started_at_utc=_utc_iso_z(run_timestamp),
+            finished_at_utc=_utc_iso_z(datetime.now(timezone.utc)),
             outputs=[
                 OutputItem(
                     key=key,
-                    name=meta.sheet or "table",
+                    name=(meta := all_metas[key]).sheet or "table",
                     csv=str(meta.csv_path) if meta.csv_path else None,
                     rows=len(df),
                     cols=len(df.columns)
                 )
-                for key, (df, meta) in zip(all_dfs.keys(), zip(all_dfs.values(), all_metas.values()))
+                for key, df in all_dfs.items()
             ],
         )
         
-        exporter = Exporter(run_dir, config)
         exporter.export_manifest(manifest)
         
         logger.log("run.end", message="Run completed successfully")
@@ -313,3 +230,211 @@ def parse_file(
     finally:
         logger.close()
 
+
+def _flat_csv_table(file_path: str, df_raw: pd.DataFrame, config: ParserConfig,
+                    logger) -> Tuple[pd.DataFrame, TableMeta]:
+    """
+    CSV 快速路径：整张表作为一个块，列名取 CSV 首行（读取时已作为表头），
+    不构建 O/B/S/T，也不做分块、表头检测与评分，只做单位行抽取
+    """
+    block = Block(0, df_raw.shape[0], 0, df_raw.shape[1], block_id="b1")
+    header_hierarchy = HeaderHierarchy(leaf_columns=[str(c) for c in df_raw.columns])
+    if logger.is_enabled(LogLevel.INFO):
+        logger.log("csv.fast_path", metrics={"rows": block.height, "cols": block.width})
+    
+    df_cleaned, unit_str, _ = Cleaner(config).clean_dataframe(df_raw, [])
+    meta = TableMeta(
+        source_file=file_path,
+        format=FileFormat.csv,
+        sheet=None,
+        bbox=(block.r0, block.r1, block.c0, block.c1),
+        is_main=True,
+        score=TableScore(area=block.area),
+        header=header_hierarchy,
+        units=unit_str,
+    )
+    return df_cleaned, meta
+
+
+def _process_block(block: Block, df_raw: pd.DataFrame, values: np.ndarray,
+                   O: np.ndarray, S: np.ndarray, T: np.ndarray, B, merged_cells: list,
+                   header_parser: HeaderParser, cleaner: Cleaner, file_path: str,
+                   file_format: FileFormat, sheet_label: Optional[str]
+                   ) -> Tuple[pd.DataFrame, TableMeta, List[int]]:
+    """
+    单个块：表头解析 → 评分 → 去表头行 → 清洗（不写日志，可在工作线程中调用）
+    返回: (清洗后的 DataFrame, TableMeta（is_main 未标记）, 移除的中段表头行)
+    """
+    # 解析表头并评分
+    header_hierarchy = header_parser.parse_headers(
+        df_raw, block, O, S, T, merged_cells, values
+    )
+    score = cleaner.calculate_table_score(block, O, T, B, header_hierarchy.header_rows)
+    
+    # 提取块数据（切片不复制，表头解析与清洗都在视图上进行，不会写回 df_raw）
+    df_block = df_raw.iloc[block.r0:block.r1, block.c0:block.c1]
+    
+    # 设置列名
+    if header_hierarchy.leaf_columns:
+        df_block.columns = header_hierarchy.leaf_columns[:len(df_block.columns)]
+        # 移除表头行
+        if header_hierarchy.header_rows:
+            header_rows = np.asarray(header_hierarchy.header_rows, dtype=np.int64)
+            header_row_indices = header_rows[(header_rows >= block.r0) & (header_rows < block.r1)] - block.r0
+            n_header = header_row_indices.size
+            if n_header and np.array_equal(header_row_indices, np.arange(n_header)):
+                # 常见情况：表头行就是块的前 n 行，直接切片，无需逐行 gather
+                df_block = df_block.iloc[n_header:].reset_index(drop=True)
+            elif n_header:
+                keep = np.ones(len(df_block), dtype=bool)
+                keep[header_row_indices] = False
+                df_block = df_block.iloc[keep].reset_index(drop=True)
+    
+    # 清洗数据
+    df_cleaned, unit_str, removed_rows = cleaner.clean_dataframe(
+        df_block, header_hierarchy.header_rows
+    )
+    # 结果可能仍是 df_raw 的视图，会让整张 sheet 的数组一直存活；复制一次（开销与块大小成正比）
+    df_cleaned = df_cleaned.copy()
+    
+    # 构建 TableMeta
+    meta = TableMeta(
+        source_file=file_path,
+        format=file_format,
+        sheet=sheet_label,
+        bbox=(block.r0, block.r1, block.c0, block.c1),
+        is_main=False,
+        score=score,
+        header=header_hierarchy,
+        units=unit_str,
+    )
+    return df_cleaned, meta, removed_rows
+
+
+class _RecordingLogger:
+    """子进程内使用：记录日志事件，由主进程按顺序回放到 DualLogger"""
+    
+    def __init__(self, log_level: LogLevel = LogLevel.INFO):
+        self.log_level = log_level
+        self.records = []
+    
+    def is_enabled(self, level: LogLevel) -> bool:
+        return level_enabled(level, self.log_level)
+    
+    def log(self, event: str, **kwargs):
+        self.records.append((event, kwargs))
+
+
+def _parse_sheet_worker(file_path: str, sheet_name_key: str, file_format: FileFormat,
+                        config: ParserConfig, read_options: Dict) -> Tuple[List[Tuple[pd.DataFrame, TableMeta]], List]:
+    """进程池任务：解析单个 sheet，返回 (表列表, 日志记录)"""
+    recorder = _RecordingLogger(config.log_level)
+    tables = _parse_single_sheet(file_path, sheet_name_key, file_format, config, read_options, recorder)
+    return tables, recorder.records
+
+
+def _parse_sheets_parallel(file_path: str, sheets: List[str], file_format: FileFormat,
+                           config: ParserConfig, read_options: Dict) -> List[Tuple[List, List]]:
+    """
+    多进程并行解析多个 sheet（config.workers > 1）
+    返回结果与 sheets 顺序一致
+    """
+    # 进程数不超过 sheet 数与 CPU 核数（多余的进程只会争抢核心）
+    max_workers = min(config.workers, len(sheets), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_parse_sheet_worker, file_path, sheet, file_format, config, read_options)
+            for sheet in sheets
+        ]
+        return [future.result() for future in futures]
+
+
+def _parse_single_sheet(file_path: str, sheet_name_key: str, file_format: FileFormat,
+                        config: ParserConfig, read_options: Dict, logger,
+                        preloaded: Optional[Tuple[pd.DataFrame, Dict]] = None) -> List[Tuple[pd.DataFrame, TableMeta]]:
+    """
+    读取并解析单个 sheet
+    preloaded: 已读取的 (df_raw, metadata)，为 None 时在此读取
+    返回: [(清洗后的 DataFrame, TableMeta)]，按块顺序排列（尚未导出 CSV）
+    """
+    sheet_label = sheet_name_key if sheet_name_key != "__csv__" else None
+    
+    if preloaded is None:
+        # 逐个处理模式：读取一个，处理一个，释放内存
+        log_info = logger.is_enabled(LogLevel.INFO)
+        if log_info:
+            logger.log("sheet.load.start", sheet=sheet_label,
+                      message=f"Loading sheet: {sheet_name_key}")
+        df_raw, metadata = read_single_sheet(
+            file_path, sheet_name_key, file_format, config.include_hidden, **read_options
+        )
+        if log_info:
+            logger.log("sheet.load.complete", sheet=sheet_label,
+                      metrics={"rows": len(df_raw), "cols": len(df_raw.columns)})
+    else:
+        df_raw, metadata = preloaded
+    
+    if file_format == FileFormat.csv and config.fast_csv_path:
+        return [_flat_csv_table(file_path, df_raw, config, logger)]
+    
+    # 构建网格
+    grid_builder = GridBuilder(df_raw, metadata, file_format)
+    if logger.is_enabled(LogLevel.INFO):
+        logger.log("grid.build", sheet=sheet_label,
+                  metrics={"cells_total": df_raw.size, "nonempty": grid_builder.count_notna()})
+    
+    O = grid_builder.build_occupancy_matrix()
+    B = grid_builder.build_border_matrix() if file_format == FileFormat.xlsx else None
+    S = grid_builder.build_style_matrix()
+    T = grid_builder.build_type_matrix()
+    merged_cells = grid_builder.get_merged_cells()
+    
+    # 分割表块
+    splitter = BlockSplitter(config, file_format)
+    blocks = splitter.split_blocks(O, B)
+    if logger.is_enabled(LogLevel.INFO):
+        logger.log("split.blocks", sheet=sheet_label,
+                  metrics={"count": len(blocks), 
+                          "sizes": [[b.height, b.width] for b in blocks]})
+    
+    if not blocks:
+        return []
+    
+    # 处理每个块
+    cleaner = Cleaner(config, splitter.O_integral)
+    header_parser = HeaderParser(config, file_format)
+    values = df_raw.to_numpy(dtype=object)  # 各块表头解析共用，避免逐单元 iloc
+    
+    # 逐块一次完成：表头解析 → 评分 → 清洗；块之间互不依赖，块多时可在线程池中并行
+    # （只读共享 df_raw 与各矩阵，不 pickle；numpy/pandas 的 C 代码释放 GIL）
+    def process(block: Block) -> Tuple[pd.DataFrame, TableMeta, List[int]]:
+        return _process_block(block, df_raw, values, O, S, T, B, merged_cells,
+                              header_parser, cleaner, file_path, file_format, sheet_label)
+    
+    n_threads = min(config.block_workers, len(blocks))
+    if n_threads > 1 and len(blocks) >= _MIN_BLOCKS_FOR_THREADS:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            results = list(executor.map(process, blocks))
+    else:
+        results = map(process, blocks)
+    
+    # 日志按块顺序在当前线程写出；主表（评分最高、并列取最先出现）在遍历中记下，最后标记
+    tables = []
+    main_idx, main_total = 0, None
+    for i, (df_cleaned, meta, removed_rows) in enumerate(results):
+        if main_total is None or meta.score.total > main_total:
+            main_idx, main_total = i, meta.score.total
+        if logger.is_enabled(LogLevel.INFO):
+            logger.log("header.detect", 
+                      sheet=sheet_label,
+                      block_id=blocks[i].block_id,
+                      metrics={"header_rows": meta.header.header_rows,
+                              "leaf_cols": len(meta.header.leaf_columns)})
+        if removed_rows:
+            logger.log("clean.mid_headers_removed",
+                      warning_code=WarningCode.MID_HEADERS_REMOVED,
+                      metrics={"rows": removed_rows})
+        tables.append((df_cleaned, meta))
+    
+    tables[main_idx][1].is_main = True
+    return tables
@@ -1,15 +1,21 @@
 """
 文件预处理器 - 检查文件大小、行数、列数等，优化性能
 """
+import itertools
 import os
+import posixpath
+import re
+import string
+import zipfile
 from pathlib import Path
 from typing import Tuple, Dict, Optional
 import openpyxl
 from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries
 try:
-    import pyxlsb
+    import python_calamine
 except ImportError:
-    pyxlsb = None
+    python_calamine = None
 
 from .models import FileFormat
 from .exceptions import FileReadError
@@ -17,9 +23,152 @@ from .logger import DualLogger
 from .models import LogLevel
 
 
+def _probe_dimensions_calamine(file_path: str) -> Tuple[int, int]:
+    """
+    用 calamine 取第一个 sheet 的 (最大行号, 最大列号)（1 起，与 openpyxl 的 max_row/max_column 同义）
+    以有值单元格的范围为准，不依赖 dimension 声明；xlsx/xlsb 均适用
+    """
+    wb = python_calamine.CalamineWorkbook.from_path(file_path)
+    try:
+        if not wb.sheet_names:
+            return 0, 0
+        end = wb.get_sheet_by_index(0).end  # 最后一个有值单元格的 (行, 列)，0 起；空 sheet 为 None
+        return (end[0] + 1, end[1] + 1) if end else (0, 0)
+    finally:
+        wb.close()
+
+
+# 列字母 ↔ 列号（1 起）查找表，覆盖 A..XFD（Excel 最大 16384 列）
+_MAX_EXCEL_COLS = 16384
+_COL_LETTERS: Tuple[str, ...] = tuple(itertools.islice(
+    ("".join(p) for n in (1, 2, 3) for p in itertools.product(string.ascii_uppercase, repeat=n)),
+    _MAX_EXCEL_COLS))
+_COL_INDEX: Dict[str, int] = {letters: i for i, letters in enumerate(_COL_LETTERS, 1)}
+_CELL_REF_RE = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)(?::\$?([A-Za-z]{1,3})\$?(\d+))?")
+
+
+def col_to_int(letters: str) -> int:
+    """列字母转列号（1 起），如 "A" → 1、"XFD" → 16384；与 openpyxl column_index_from_string 一致"""
+    try:
+        return _COL_INDEX[letters.upper()]
+    except KeyError:
+        raise ValueError(f"{letters!r} is not a valid column name") from None
+
+
+def int_to_col(index: int) -> str:
+    """列号（1 起）转列字母，如 1 → "A"；与 openpyxl get_column_letter 一致"""
+    if not 1 <= index <= _MAX_EXCEL_COLS:
+        raise ValueError(f"Invalid column index {index}")
+    return _COL_LETTERS[index - 1]
+
+
+def ref_boundaries(ref: str) -> Tuple[int, int, int, int]:
+    """
+    A1 形式的单元格/区域引用转 (min_col, min_row, max_col, max_row)（1 起）
+    常见的 "A1" / "A1:C10" 走查找表；整行/整列等其他形式交给 openpyxl range_boundaries，结果一致
+    """
+    m = _CELL_REF_RE.fullmatch(ref)
+    if m is None:
+        return range_boundaries(ref)
+    c0, r0, c1, r1 = m.groups()
+    min_col = _COL_INDEX.get(c0.upper())
+    max_col = min_col if c1 is None else _COL_INDEX.get(c1.upper())
+    if min_col is None or max_col is None:  # 超出 XFD 的列
+        return range_boundaries(ref)
+    min_row = int(r0)
+    return min_col, min_row, max_col, min_row if r1 is None else int(r1)
+
+
+# xlsx 包内结构：workbook.xml 中第一个 <sheet> 的 r:id → workbook.xml.rels 中的 Target → sheet XML
+_WORKBOOK_PART = "xl/workbook.xml"
+_WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+_SHARED_STRINGS_PART = "xl/sharedStrings.xml"
+_FIRST_SHEET_RE = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?\b\w+:id="([^"]+)"')
+_RELATIONSHIP_RE = re.compile(rb'<(?:\w+:)?Relationship\b[^>]*>')
+_REL_ATTR_RE = re.compile(rb'\b(Id|Target)="([^"]*)"')
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\b[^>]*?\bref="([^"]+)"')
+# <dimension> 紧跟在 sheetPr 之后，只读 sheet XML 的开头
+_DIMENSION_SCAN_BYTES = 4096
+
+
+def _first_sheet_part(zf: zipfile.ZipFile) -> Optional[str]:
+    """解析第一个 sheet 在包内的路径（与 openpyxl 的 sheet 顺序一致）；无法解析时返回 None"""
+    m = _FIRST_SHEET_RE.search(zf.read(_WORKBOOK_PART))
+    if m is None:
+        return None
+    rid = m.group(1)
+    for rel in _RELATIONSHIP_RE.findall(zf.read(_WORKBOOK_RELS_PART)):
+        attrs = dict(_REL_ATTR_RE.findall(rel))
+        if attrs.get(b"Id") == rid and b"Target" in attrs:
+            target = attrs[b"Target"].decode("utf-8")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    return None
+
+
+def _probe_dimensions_zip(file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    直接读 xlsx 包中第一个 sheet XML 开头的 <dimension ref="A1:C10"/>，不解析单元格
+    与 openpyxl 只读模式的 max_row/max_column 同源；缺少 dimension 声明时返回 None
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        part = _first_sheet_part(zf)
+        if part is None:
+            return None
+        with zf.open(part) as f:
+            head = f.read(_DIMENSION_SCAN_BYTES)
+    m = _DIMENSION_RE.search(head)
+    if m is None:
+        return None
+    try:
+        _, _, max_col, max_row = ref_boundaries(m.group(1).decode("ascii"))
+    except (ValueError, TypeError):
+        return None
+    return max_row or 0, max_col or 0
+
+
+def _shared_strings_size(file_path: str) -> int:
+    """xlsx 共享字符串表解压后的字节数（读 ZIP 目录即可，不解压）；不存在时为 0"""
+    with zipfile.ZipFile(file_path) as zf:
+        try:
+            return zf.getinfo(_SHARED_STRINGS_PART).file_size
+        except KeyError:
+            return 0
+
+
+def _probe_dimensions_xlsx(file_path: str) -> Tuple[int, int]:
+    """xlsx 尺寸探测：优先读 dimension 声明，缺失或包结构异常时退回 openpyxl"""
+    try:
+        dims = _probe_dimensions_zip(file_path)
+    except (zipfile.BadZipFile, KeyError):
+        dims = None
+    return dims if dims is not None else _probe_dimensions_openpyxl(file_path)
+
+
+def _probe_dimensions_openpyxl(file_path: str) -> Tuple[int, int]:
+    """用 openpyxl 只读模式取第一个 sheet 的 (max_row, max_column)（来自 dimension 声明，缺失时为 0）"""
+    wb = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if not wb.sheetnames:
+            return 0, 0
+        ws = wb[wb.sheetnames[0]]
+        return ws.max_row or 0, ws.max_column or 0
+    finally:
+        wb.close()
+
+
+# 尺寸探测结果缓存上限（按文件路径计）
+_DIMENSION_CACHE_SIZE = 128
+
+
 class FilePreprocessor:
     """文件预处理器"""
     
+    # 尺寸探测缓存（进程内共享）：路径 → ((st_mtime_ns, st_size, 探测函数), (行数, 列数))
+    # 文件被修改（mtime/大小变化）后旧结果自动失效
+    _dimension_cache: Dict[str, Tuple[Tuple, Tuple[int, int]]] = {}
+    
     def __init__(self, config, logger: Optional[DualLogger] = None):
         self.config = config
         self.logger = logger
@@ -39,7 +188,8 @@ class FilePreprocessor:
         }
         
         # 1. 检查文件大小
-        file_size = os.path.getsize(file_path)
+        stat = os.stat(file_path)
+        file_size = stat.st_size
         file_size_mb = file_size / (1024 * 1024)
         info["file_size_mb"] = file_size_mb
         
@@ -50,57 +200,57 @@ class FilePreprocessor:
             if self.logger:
                 self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning)
         
-        # 2. 快速检查行数和列数（不加载完整数据）
-        if format == FileFormat.xlsx:
+        # 2. 快速检查第一个 sheet 的行数和列数（作为参考，不加载到 DataFrame）
+        #    有 calamine 时 xlsx/xlsb 都用它；否则 xlsx 读 dimension 声明，xlsb 不检查
+        probe = None
+        if format in (FileFormat.xlsx, FileFormat.xlsb) and self.config.engine == "calamine" \
+                and python_calamine is not None:
+            probe = _probe_dimensions_calamine
+        elif format == FileFormat.xlsx:
+            probe = _probe_dimensions_xlsx
+        
+        if probe is not None:
             try:
-                # 使用只读模式快速检查
-                wb = load_workbook(file_path, read_only=True, data_only=True)
-                if wb.sheetnames:
-                    # 检查第一个 sheet 的尺寸（作为参考）
-                    ws = wb[wb.sheetnames[0]]
-                    max_row = ws.max_row or 0
-                    max_col = ws.max_column or 0
-                    info["estimated_rows"] = max_row
-                    info["estimated_cols"] = max_col
-                    
-                    if max_row > self.config.max_rows:
-                        warning = f"Sheet 行数 {max_row} 超过限制 {self.config.max_rows}，将截断处理"
-                        info["warnings"].append(warning)
-                        info["should_optimize"] = True
-                        if self.logger:
-                            self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning,
-                                          metrics={"rows": max_row, "limit": self.config.max_rows})
-                    
-                    if max_col > self.config.max_cols:
-                        warning = f"Sheet 列数 {max_col} 超过限制 {self.config.max_cols}，将截断处理"
-                        info["warnings"].append(warning)
-                        info["should_optimize"] = True
-                        if self.logger:
-                            self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning,
-                                          metrics={"cols": max_col, "limit": self.config.max_cols})
-                
-                wb.close()
+                max_row, max_col = self._probe_cached(probe, file_path, stat)
             except Exception as e:
-                # 如果只读模式失败，记录但不阻止处理
+                # 检查失败只记录，不阻止处理
                 if self.logger:
                     self.logger.log("preprocess.skip", level=LogLevel.WARN,
                                   message=f"无法快速检查文件尺寸: {str(e)}")
+            else:
+                info["estimated_rows"] = max_row
+                info["estimated_cols"] = max_col
+                
+                if max_row > self.config.max_rows:
+                    warning = f"Sheet 行数 {max_row} 超过限制 {self.config.max_rows}，将截断处理"
+                    info["warnings"].append(warning)
+                    info["should_optimize"] = True
+                    if self.logger:
+                        self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning,
+                                      metrics={"rows": max_row, "limit": self.config.max_rows})
+                
+                if max_col > self.config.max_cols:
+                    warning = f"Sheet 列数 {max_col} 超过限制 {self.config.max_cols}，将截断处理"
+                    info["warnings"].append(warning)
+                    info["should_optimize"] = True
+                    if self.logger:
+                        self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning,
+                                      metrics={"cols": max_col, "limit": self.config.max_cols})
         
-        elif format == FileFormat.xlsb:
-            # xlsb 格式的快速检查
-            if pyxlsb:
-                try:
-                    with pyxlsb.open_workbook(file_path) as wb:
-                        if wb.sheets:
-                            sheet_name = list(wb.sheets)[0]
-                            ws = wb.get_sheet(sheet_name)
-                            # xlsb 没有直接获取 max_row 的方法，需要估算
-                            # 这里简化处理
-                            pass
-                except Exception:
-                    pass
+        # 3. 共享字符串表过大时（解压后）同样按大文件处理：pandas/openpyxl 读取时会整表载入
+        if format == FileFormat.xlsx:
+            try:
+                shared_mb = _shared_strings_size(file_path) / (1024 * 1024)
+            except (OSError, zipfile.BadZipFile):
+                shared_mb = 0.0
+            if shared_mb > self.config.max_file_size_mb:
+                warning = f"共享字符串表 {shared_mb:.2f}MB 超过建议值 {self.config.max_file_size_mb}MB，处理可能较慢"
+                info["warnings"].append(warning)
+                info["should_optimize"] = True
+                if self.logger:
+                    self.logger.log("preprocess.warning", level=LogLevel.WARN, message=warning)
         
-        # 3. 记录预处理信息
+        # 4. 记录预处理信息
         if self.logger:
             self.logger.log("preprocess.complete", 
                           metrics={
@@ -113,11 +263,19 @@ class FilePreprocessor:
         
         return info
     
-    def get_optimized_limits(self, estimated_rows: int, estimated_cols: int) -> Tuple[int, int]:
-        """
-        根据估算的行列数，返回优化的读取限制
-        """
-        max_row = min(estimated_rows, self.config.max_rows) if estimated_rows > 0 else self.config.max_rows
-        max_col = min(estimated_cols, self.config.max_cols) if estimated_cols > 0 else self.config.max_cols
-        return max_row, max_col
+    def _probe_cached(self, probe, file_path: str, stat: os.stat_result) -> Tuple[int, int]:
+        """带缓存的尺寸探测：同一文件未修改时直接复用上次结果（探测失败不缓存）"""
+        path = os.path.abspath(file_path)
+        key = (stat.st_mtime_ns, stat.st_size, probe)
+        cached = self._dimension_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        
+        dims = probe(file_path)
+        cache = self._dimension_cache
+        cache.pop(path, None)
+        if len(cache) >= _DIMENSION_CACHE_SIZE:
+            cache.pop(next(iter(cache)))  # 丢弃最早写入的条目
+        cache[path] = (key, dims)
+        return dims
 